@@ -11,6 +11,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from .static import ASGIStaticFiles
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdfunding.settings')
+# The read endpoints with async views use them (see projects/urls.py)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
+application = ASGIStaticFiles(get_asgi_application())
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv("../.env")
@@ -39,6 +40,7 @@ DEBUG = os.environ.get(
 
 ALLOWED_HOSTS = ['*']
 CORS_ORIGIN_ALLOW_ALL = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # Application definition
 
@@ -58,9 +60,15 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # Token first: a request with a valid token never touches the session
+        'users.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # orjson when it is installed, with the same output as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'projects.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     #     # 'DEFAULT_PERMISSION_CLASSES': [
     #     # 'rest_framework.permissions.IsAuthenticated',  # Ensure users must be authenticated
     # ],
@@ -69,9 +77,112 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Response cache for public GET endpoints (see projects/cache.py).
+# 'lru' keeps entries in each worker's memory, 'django' shares them through
+# the Django cache named by RESPONSE_CACHE_ALIAS (e.g. Redis or Memcached).
+RESPONSE_CACHE = {
+    'ENABLED': os.environ.get('RESPONSE_CACHE_ENABLED', 'True') != 'False',
+    'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'lru'),
+    'ALIAS': os.environ.get('RESPONSE_CACHE_ALIAS', 'default'),
+    'MAX_ENTRIES': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)),
+    'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
+# Authenticated tokens cached per worker (see users/authentication.py).
+# Deleting a token or saving its user reaches the other workers through the
+# Django cache named by TOKEN_AUTH_CACHE_ALIAS; unless that is shared (e.g.
+# Redis or Memcached), they keep accepting the old token for up to TIMEOUT.
+TOKEN_AUTH_CACHE = {
+    'MAX_ENTRIES': int(os.environ.get('TOKEN_AUTH_CACHE_MAX_ENTRIES', 10000)),
+    'TIMEOUT': int(os.environ.get('TOKEN_AUTH_CACHE_TIMEOUT', 60)),
+    'ALIAS': os.environ.get('TOKEN_AUTH_CACHE_ALIAS', 'default'),
+}
+
+# Background jobs (see projects/jobs.py), run by `manage.py run_jobs`.
+# JOBS_EAGER runs them in the web process after each commit instead, which
+# is handy without a worker in development.
+JOBS = {
+    'EAGER': os.environ.get('JOBS_EAGER', str(DEBUG)) != 'False',
+    'LEASE_SECONDS': int(os.environ.get('JOBS_LEASE_SECONDS', 300)),
+    'MAX_ATTEMPTS': int(os.environ.get('JOBS_MAX_ATTEMPTS', 5)),
+}
+
+# Request metrics served at /api/metrics/ (see projects/metrics.py).
+# Prometheus authenticates with METRICS_TOKEN as a bearer token.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', 'True') != 'False',
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+    'SLOW_REQUEST_SECONDS': float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0)),
+}
+
+# List endpoints render values() rows with generated functions instead of
+# DRF serializers (see projects/compiled.py). Turn off to compare output.
+COMPILED_SERIALIZERS = {
+    'ENABLED': os.environ.get('COMPILED_SERIALIZERS_ENABLED', 'True') != 'False',
+}
+
+# gzip/brotli for JSON, CSV and NDJSON responses (see projects/compression.py).
+# Brotli is used when the Brotli package is installed and the client accepts it.
+COMPRESSION = {
+    'ENABLED': os.environ.get('COMPRESSION_ENABLED', 'True') != 'False',
+    'MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    'GZIP_LEVEL': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    'BROTLI_QUALITY': int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5)),
+}
+
+# Serve the read endpoints that have async views with them, not the sync
+# ones. asgi.py turns this on; under WSGI async views only add overhead.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') != 'False'
+
+# Pledge POSTs sent with an Idempotency-Key header are replayed, not
+# repeated, when retried within IDEMPOTENCY_TTL_SECONDS (see
+# projects/idempotency.py). run_jobs purges expired keys.
+IDEMPOTENCY = {
+    'TTL_SECONDS': int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400)),
+}
+
+# JSON lines to stdout. Per-write debug logs are sampled (LOG_SAMPLE_RATE)
+# so turning LOG_LEVEL down to DEBUG doesn't flood a busy worker.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'projects.log.JSONFormatter'},
+    },
+    'filters': {
+        'sample': {'()': 'projects.log.SampleFilter', 'rate': os.environ.get('LOG_SAMPLE_RATE', '0.01')},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json', 'filters': ['sample']},
+    },
+    'loggers': {
+        'projects': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO'), 'propagate': False},
+        'users': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
+
+# Request profiling (see projects/profiling.py). Send the header
+# `X-Profile: <PROFILING_TOKEN>` to profile one request, or set
+# PROFILING_SAMPLE_RATE to profile a fraction of all traffic. Profiles are
+# read from /api/profiles/ or with `manage.py profile_report`.
+PROFILING = {
+    'TOKEN': os.environ.get('PROFILING_TOKEN', ''),
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0)),
+    'MODE': os.environ.get('PROFILING_MODE', 'cprofile'),
+}
+
 MIDDLEWARE = [
+    # Outside the metrics, so profiler overhead doesn't skew them
+    'projects.profiling.ProfilingMiddleware',
+    # Next, so its timings cover every other middleware
+    'projects.metrics.MetricsMiddleware',
+    # Picks the database for the request's reads
+    'projects.routers.ReplicaMiddleware',
+    # Inside the metrics, so response sizes are what goes over the wire
+    'projects.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise serves static files from asgi.py/wsgi.py instead: its
+    # middleware is sync-only and would make the whole chain sync
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -117,6 +228,63 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL:
     DATABASES['default'] = dj_database_url.config(conn_max_age=500, ssl_require=False)
 
+# Read replicas, as a comma-separated REPLICA_DATABASE_URLS. Safe requests
+# to the API views read from one of them (see projects/routers.py); a client
+# that writes is kept on the primary for REPLICA_PIN_SECONDS afterwards.
+# With several workers, point REPLICAS['CACHE_ALIAS'] at a shared cache so
+# the pin is seen by all of them. Test runs mirror the replicas to 'default'.
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv('REPLICA_DATABASE_URLS', '').split(',') if url.strip()]
+for number, url in enumerate(REPLICA_DATABASE_URLS, start=1):
+    DATABASES[f'replica{number}'] = {
+        **dj_database_url.parse(url, conn_max_age=500, ssl_require=False),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['projects.routers.ReplicaRouter']
+
+# Connection handling for every database above.
+# Postgres: with psycopg 3 and psycopg-pool installed, each worker process
+# keeps a pool of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections. Keep
+# workers * DB_POOL_MAX_SIZE below the server's max_connections. A request
+# waits up to DB_POOL_TIMEOUT seconds for a free connection. DB_POOL=False
+# falls back to persistent connections. Either way CONN_HEALTH_CHECKS has
+# connections checked before they are handed out (Django passes the pool
+# its check= itself, so it can't go in OPTIONS['pool']).
+# SQLite: WAL lets reads run alongside a write, and writers wait for the
+# lock (SQLITE_BUSY_TIMEOUT) instead of failing with "database is locked".
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+DB_POOL = os.getenv('DB_POOL', 'True') != 'False' and ConnectionPool is not None
+
+for database in DATABASES.values():
+    if database['ENGINE'] == 'django.db.backends.postgresql':
+        if DB_POOL:
+            database['CONN_MAX_AGE'] = 0  # The pool decides how long connections live
+            database.setdefault('OPTIONS', {})['pool'] = {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+                'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            }
+        database['CONN_HEALTH_CHECKS'] = True
+    elif database['ENGINE'] == 'django.db.backends.sqlite3':
+        database.setdefault('OPTIONS', {}).update({
+            'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+            # Take the write lock when the transaction starts, so two
+            # transactions can't both read and then deadlock upgrading
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        })
+
+REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'PIN_SECONDS': int(os.getenv('REPLICA_PIN_SECONDS', 5)),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
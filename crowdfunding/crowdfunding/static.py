@@ -0,0 +1,78 @@
+"""
+Static files served in front of Django rather than from its middleware.
+
+WhiteNoise's middleware is sync-only, and one sync-only middleware makes
+Django adapt the whole chain to sync: under ASGI every request then runs in
+the single thread-sensitive worker thread, one at a time. Wrapping the
+application instead keeps the middleware chain async.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from whitenoise import WhiteNoise
+
+CHUNK_SIZE = 64 * 1024
+
+
+def static_files():
+    return WhiteNoise(
+        None,
+        root=settings.STATIC_ROOT,
+        prefix=settings.STATIC_URL,
+        autorefresh=settings.DEBUG,
+        max_age=0 if settings.DEBUG else 60,
+    )
+
+
+def wsgi_static(application):
+    files = static_files()
+    files.application = application
+    return files
+
+
+class ASGIStaticFiles:
+    """WhiteNoise's file index and responses, sent over ASGI."""
+
+    def __init__(self, application):
+        self.application = application
+        self.files = static_files()
+
+    def find(self, path):
+        if self.files.autorefresh:
+            return self.files.find_file(path)
+        return self.files.files.get(path)
+
+    async def __call__(self, scope, receive, send):
+        static_file = None
+        if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+            static_file = self.find(scope['path'])
+        if static_file is None:
+            return await self.application(scope, receive, send)
+
+        # WhiteNoise reads request headers from a WSGI environ
+        environ = {
+            'HTTP_' + name.decode('latin1').upper().replace('-', '_'): value.decode('latin1')
+            for name, value in scope['headers']
+        }
+        response = static_file.get_response(scope['method'], environ)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in response.headers
+            ],
+        })
+        if response.file is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        read = sync_to_async(response.file.read, thread_sensitive=False)
+        try:
+            chunk = await read(CHUNK_SIZE)
+            while True:
+                following = await read(CHUNK_SIZE)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': bool(following)})
+                if not following:
+                    break
+                chunk = following
+        finally:
+            response.file.close()
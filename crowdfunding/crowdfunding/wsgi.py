@@ -11,6 +11,8 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from .static import wsgi_static
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdfunding.settings')
 
-application = get_wsgi_application()
+application = wsgi_static(get_wsgi_application())
@@ -1,9 +1,12 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import AthleteProfile, Pledge, ProgressUpdate
+from .models import AthleteProfile, AthleteStats, IdempotencyKey, Job, Pledge, ProgressUpdate, RequestProfile
 
 admin.site.register(AthleteProfile)
 admin.site.register(Pledge)
 admin.site.register(ProgressUpdate)
-
+admin.site.register(AthleteStats)
+admin.site.register(Job)
+admin.site.register(RequestProfile)
+admin.site.register(IdempotencyKey)
@@ -0,0 +1,226 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.dateparse import parse_datetime
+
+from . import models
+
+# Stats columns compared by the drift check, in display order
+STATS_FIELDS = [
+    'pledge_count', 'total_pledged', 'anonymous_pledged', 'supporter_count', 'last_pledge_at', 'update_count'
+]
+
+
+def pledge_deltas(before, after):
+    """
+    The AthleteStats changes one pledge write makes, as {athlete id: delta}
+    with JSON-ready deltas for apply_delta. `before` and `after` are
+    Pledge.snapshot() style dicts, or None when the pledge was just created
+    or deleted. Call it in the write's transaction, holding AthleteProfile.lock()
+    on the athletes: whether the supporter is new to (or gone from) the
+    athlete is decided against the pledges as the write left them, which
+    only includes concurrent writes once they have committed.
+    """
+    deltas = {}
+    if before and after and (
+        before['athlete_profile_id'] == after['athlete_profile_id']
+        and before['supporter_id'] == after['supporter_id']
+    ):
+        # Edited in place: only the amounts can have moved
+        delta = _delta(deltas, after['athlete_profile_id'])
+        delta['total_pledged'] += after['amount'] - before['amount']
+        delta['anonymous_pledged'] += _anonymous_amount(after) - _anonymous_amount(before)
+    else:
+        if before:
+            _remove(_delta(deltas, before['athlete_profile_id']), before)
+        if after:
+            _add(_delta(deltas, after['athlete_profile_id']), after)
+
+    return _serialized(deltas)
+
+
+def new_pledge_deltas(pledges):
+    """
+    pledge_deltas() for a batch of Pledge instances about to be inserted,
+    one delta per athlete. Call it before inserting them, in the same
+    transaction and under the same locks.
+    """
+    pairs = {(pledge.athlete_profile_id, pledge.supporter_id) for pledge in pledges}
+    # The supporters who had already pledged to these athletes, in one query
+    known = set(
+        models.Pledge.objects.filter(
+            athlete_profile_id__in={athlete_id for athlete_id, _ in pairs},
+            supporter_id__in={supporter_id for _, supporter_id in pairs},
+        ).values_list('athlete_profile_id', 'supporter_id').distinct()
+    )
+
+    deltas = {}
+    for pledge in pledges:
+        delta = _delta(deltas, pledge.athlete_profile_id)
+        delta['pledge_count'] += 1
+        delta['total_pledged'] += pledge.amount
+        delta['anonymous_pledged'] += pledge.amount if pledge.anonymous else Decimal('0')
+        if delta['last_pledge_at'] is None or pledge.date_created > delta['last_pledge_at']:
+            delta['last_pledge_at'] = pledge.date_created
+    for pair in pairs - known:
+        deltas[pair[0]]['supporter_count'] += 1
+    return _serialized(deltas)
+
+
+def _serialized(deltas):
+    # JSON-ready, so deltas can go into job payloads
+    return {
+        athlete_id: {
+            **delta,
+            'total_pledged': str(delta['total_pledged']),
+            'anonymous_pledged': str(delta['anonymous_pledged']),
+            'last_pledge_at': delta['last_pledge_at'] and delta['last_pledge_at'].isoformat(),
+        }
+        for athlete_id, delta in deltas.items() if any(delta.values())
+    }
+
+
+def _delta(deltas, athlete_id):
+    return deltas.setdefault(athlete_id, {
+        'pledge_count': 0,
+        'total_pledged': Decimal('0'),
+        'anonymous_pledged': Decimal('0'),
+        'supporter_count': 0,
+        'last_pledge_at': None,  # A pledge time the latest must be at least
+        'recount_last': False,  # The latest pledge may have gone, look it up again
+    })
+
+
+def _add(delta, pledge):
+    first_from_supporter = not models.Pledge.objects.filter(
+        athlete_profile_id=pledge['athlete_profile_id'], supporter_id=pledge['supporter_id']
+    ).exclude(pk=pledge['id']).exists()
+
+    delta['pledge_count'] += 1
+    delta['total_pledged'] += pledge['amount']
+    delta['anonymous_pledged'] += _anonymous_amount(pledge)
+    delta['supporter_count'] += int(first_from_supporter)
+    delta['last_pledge_at'] = pledge['date_created']
+
+
+def _remove(delta, pledge):
+    last_supporter_pledge = not models.Pledge.objects.filter(
+        athlete_profile_id=pledge['athlete_profile_id'], supporter_id=pledge['supporter_id']
+    ).exists()
+
+    delta['pledge_count'] -= 1
+    delta['total_pledged'] -= pledge['amount']
+    delta['anonymous_pledged'] -= _anonymous_amount(pledge)
+    delta['supporter_count'] -= int(last_supporter_pledge)
+    delta['recount_last'] = True
+
+
+def _anonymous_amount(pledge):
+    return pledge['amount'] if pledge['anonymous'] else Decimal('0')
+
+
+def apply_delta(athlete_id, pledge_count, total_pledged, anonymous_pledged, supporter_count,
+                last_pledge_at, recount_last):
+    """
+    Adds one pledge_deltas() delta to the athlete's AthleteStats row. Deltas
+    commute, so they can be applied in any order, but each exactly once.
+    """
+    changes = {
+        'pledge_count': F('pledge_count') + pledge_count,
+        'total_pledged': F('total_pledged') + Decimal(total_pledged),
+        'anonymous_pledged': F('anonymous_pledged') + Decimal(anonymous_pledged),
+        'supporter_count': F('supporter_count') + supporter_count,
+    }
+    if recount_last:
+        changes['last_pledge_at'] = models.Pledge.objects.filter(
+            athlete_profile_id=athlete_id
+        ).aggregate(latest=Max('date_created'))['latest']
+    elif last_pledge_at:
+        last_pledge_at = parse_datetime(last_pledge_at)
+        changes['last_pledge_at'] = Greatest(
+            Coalesce(F('last_pledge_at'), Value(last_pledge_at)), Value(last_pledge_at)
+        )
+
+    updated = models.AthleteStats.objects.filter(athlete_profile_id=athlete_id).update(**changes)
+    if not updated and models.AthleteProfile.objects.filter(pk=athlete_id).exists():
+        # No stats row to add to (e.g. an athlete created before stats
+        # existed): that is drift, build it from the pledges instead
+        rebuild_stats([athlete_id])
+
+
+def compute_stats(athlete_ids=None):
+    """
+    Aggregates AthleteStats values straight from Pledge and ProgressUpdate,
+    keyed by athlete id. Athletes without pledges are included with zero
+    totals.
+    """
+    athletes = models.AthleteProfile.objects.all()
+    if athlete_ids is not None:
+        athletes = athletes.filter(pk__in=athlete_ids)
+    # A subquery, so joining updates doesn't repeat the pledge rows
+    updates = (
+        models.ProgressUpdate.objects.filter(athlete_profile=OuterRef('pk'))
+        .order_by().values('athlete_profile').annotate(count=Count('pk')).values('count')
+    )
+
+    rows = athletes.order_by().values('pk').annotate(
+        pledge_count=Count('pledges'),
+        total_pledged=Coalesce(Sum('pledges__amount'), Value(Decimal('0'))),
+        anonymous_pledged=Coalesce(
+            Sum('pledges__amount', filter=Q(pledges__anonymous=True)), Value(Decimal('0'))
+        ),
+        supporter_count=Count('pledges__supporter', distinct=True),
+        last_pledge_at=Max('pledges__date_created'),
+        update_count=Coalesce(Subquery(updates), Value(0)),
+    )
+    return {row.pop('pk'): row for row in rows}
+
+
+def rebuild_stats(athlete_ids=None, batch_size=1000):
+    """
+    Recomputes AthleteStats from scratch, for every athlete or just the ones
+    given, with a single aggregate query and bulk upserts.
+    """
+    computed = compute_stats(athlete_ids)
+    stats = [
+        models.AthleteStats(athlete_profile_id=athlete_id, **values)
+        for athlete_id, values in computed.items()
+    ]
+    with transaction.atomic():
+        models.AthleteStats.objects.bulk_create(
+            stats,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['athlete_profile'],
+            update_fields=STATS_FIELDS,
+        )
+    return len(stats)
+
+
+def find_drift(athlete_ids=None):
+    """
+    Compares stored AthleteStats (and AthleteProfile.funds_raised) against
+    freshly computed values. Returns (athlete_id, field, stored, expected)
+    tuples for every mismatch.
+    """
+    computed = compute_stats(athlete_ids)
+    stored = {
+        stats.athlete_profile_id: stats
+        for stats in models.AthleteStats.objects.filter(athlete_profile_id__in=computed.keys())
+    }
+    funds = dict(
+        models.AthleteProfile.objects.filter(pk__in=computed.keys()).values_list('pk', 'funds_raised')
+    )
+
+    drift = []
+    for athlete_id, expected in computed.items():
+        stats = stored.get(athlete_id)
+        for field in STATS_FIELDS:
+            value = getattr(stats, field) if stats else None
+            if value != expected[field]:
+                drift.append((athlete_id, field, value, expected[field]))
+        if funds[athlete_id] != expected['total_pledged']:
+            drift.append((athlete_id, 'funds_raised', funds[athlete_id], expected['total_pledged']))
+    return drift
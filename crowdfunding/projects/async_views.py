@@ -0,0 +1,160 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import profiling, views
+from .cache import athlete_tag, cache_response
+from .filters import AthleteFilterSerializer, filter_athletes
+from .models import AthleteProfile, Pledge, ProgressUpdate
+from .querysets import plan_queryset
+from .fieldsets import requested, requested_columns
+from .compiled import plan_for
+from .serializers import (
+    ATHLETE_SUMMARY_FIELDS,
+    AthleteProfileDetailSerializer,
+    PledgeSerializer,
+    ProgressUpdateSerializer,
+    annotate_counts,
+    attach_latest_rows,
+    embed_latest,
+    load_latest,
+    with_counts,
+)
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines. Authentication, permissions and
+    throttling still run the sync DRF code, in a worker thread; the handler
+    itself uses the async ORM so a slow query doesn't hold a worker.
+
+    Handlers must not leave lazy queries behind for rendering: fetch every
+    row the serializer reads up front (plan_queryset does this).
+    """
+    # Django refuses views that mix sync and async handlers
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            # A profiled request's middleware may be running in another thread
+            with profiling.watching():
+                response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        return await sync_to_async(super().options)(request, *args, **kwargs)
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        return super().http_method_not_allowed(request, *args, **kwargs)
+
+
+def read_view(sync_view, async_view):
+    """
+    The URLconf view for an endpoint with an async version: with
+    ASYNC_VIEWS on, GET and HEAD go to async_view and other methods to
+    sync_view, which Django would otherwise run in a worker thread anyway.
+    """
+    sync_view = sync_view.as_view()
+    if not settings.ASYNC_VIEWS:
+        return sync_view
+    async_view = async_view.as_view()
+    run_sync = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await run_sync(request, *args, **kwargs)
+
+    return csrf_exempt(view)
+
+
+async def aserialize_page(view, queryset, serializer_class, fieldset):
+    # views.serialize_page with the async ORM
+    plan = plan_for(serializer_class, fieldset)
+    if plan is None:
+        page = await view.apaginate_queryset(plan_queryset(queryset, serializer_class, **fieldset))
+        return serializer_class(page, many=True, **fieldset).data
+    rows = await view.apaginate_queryset(plan.values(queryset, view.paginator.ordering))
+    return plan.render(rows)
+
+
+class AsyncAthleteProfileList(AsyncAPIView, views.AthleteProfileList):
+
+    @cache_response(views.athlete_list_tags)
+    async def get(self, request):
+        filters = AthleteFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        athletes, self.paginator.ordering = filter_athletes(
+            AthleteProfile.objects.all(), filters.validated_data
+        )
+
+        if request.query_params.get('view') == 'summary':
+            names = requested_columns(request, ATHLETE_SUMMARY_FIELDS)
+            ordering_fields = [name.lstrip('-') for name in self.paginator.ordering]
+            rows = athletes.values(*ATHLETE_SUMMARY_FIELDS, *ordering_fields)
+            page = await self.apaginate_queryset(rows)
+            self.cache_tags = views.page_tags(page)
+            return self.get_paginated_response(views.summary_results(page, names))
+
+        fieldset = requested(request)
+        plan = plan_for(AthleteProfileDetailSerializer, fieldset)
+        if plan is None:
+            page = await self.apaginate_queryset(embed_latest(athletes, **fieldset))
+            self.cache_tags = views.page_tags(page)
+            serializer = AthleteProfileDetailSerializer(page, many=True, **fieldset)
+            return self.get_paginated_response(serializer.data)
+        rows = await self.apaginate_queryset(
+            plan.values(annotate_counts(athletes, plan.names), self.paginator.ordering)
+        )
+        self.cache_tags = views.page_tags(rows)
+        rows = await sync_to_async(attach_latest_rows)(rows, plan)
+        return self.get_paginated_response(plan.render(rows))
+
+
+class AsyncAthleteProfileDetail(AsyncAPIView, views.AthleteProfileDetail):
+
+    @cache_response(lambda request, data, pk: [athlete_tag(pk)])
+    async def get(self, request, pk):
+        fieldset = requested(request)
+        try:
+            profile = await with_counts(AthleteProfile.objects.all(), **fieldset).aget(pk=pk)
+        except AthleteProfile.DoesNotExist:
+            raise Http404
+        self.check_object_permissions(request, profile)
+        serializer = AthleteProfileDetailSerializer(profile, context={'request': request}, **fieldset)
+        await sync_to_async(load_latest)(profile, serializer.fields)
+        return Response(serializer.data)
+
+
+class AsyncPledgeList(AsyncAPIView, views.PledgeList):
+
+    @cache_response(lambda request, data: ['pledges'])
+    async def get(self, request):
+        data = await aserialize_page(self, Pledge.objects.all(), PledgeSerializer, requested(request))
+        return self.get_paginated_response(data)
+
+
+class AsyncProgressUpdateList(AsyncAPIView, views.ProgressUpdateList):
+
+    @cache_response(lambda request, data: ['updates'])
+    async def get(self, request):
+        data = await aserialize_page(self, ProgressUpdate.objects.all(), ProgressUpdateSerializer, requested(request))
+        return self.get_paginated_response(data)
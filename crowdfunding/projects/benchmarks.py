@@ -0,0 +1,424 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from .compiled import plan_for
+from .compression import available_encodings, compress
+from .compression import get_config as compression_config
+from .models import AthleteProfile, AthleteStats, Pledge, ProgressUpdate
+from .renderers import FastJSONRenderer
+from .serializers import (
+    ATHLETE_SUMMARY_FIELDS,
+    AthleteProfileDetailSerializer,
+    AthleteProfileSerializer,
+    PledgeSerializer,
+    ProgressUpdateSerializer,
+    UserSerializer,
+    athlete_summary,
+    load_latest,
+    with_counts,
+)
+
+RESULTS_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+
+def time_calls(func, iterations, warmup=3):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def serializer_cases(size):
+    """
+    name -> (objects per call, function that serializes them). The rows are
+    read once up front, so only the serializer itself is timed.
+    """
+    athletes = list(AthleteProfile.objects.select_related('owner').order_by('-pk')[:size])
+    pledges = list(Pledge.objects.select_related('supporter').order_by('-pk')[:size])
+    updates = list(ProgressUpdate.objects.order_by('-pk')[:size])
+    users = list(get_user_model().objects.order_by('-pk')[:size])
+    summaries = list(AthleteProfile.objects.order_by('-pk').values(*ATHLETE_SUMMARY_FIELDS)[:size])
+    busiest = with_counts(AthleteProfile.objects.filter(pk=_busiest_athlete())).first()
+    if busiest is not None:
+        load_latest(busiest, AthleteProfileDetailSerializer().fields)
+
+    cases = {
+        'AthleteProfileSerializer': (athletes, lambda: AthleteProfileSerializer(athletes, many=True).data),
+        'PledgeSerializer': (pledges, lambda: PledgeSerializer(pledges, many=True).data),
+        'ProgressUpdateSerializer': (updates, lambda: ProgressUpdateSerializer(updates, many=True).data),
+        'UserSerializer': (users, lambda: UserSerializer(users, many=True).data),
+        'athlete_summary': (summaries, lambda: [athlete_summary(row) for row in summaries]),
+    }
+    if busiest is not None:
+        cases['AthleteProfileDetailSerializer'] = (
+            [busiest], lambda: AthleteProfileDetailSerializer(busiest).data,
+        )
+
+    # The compiled read path over values() rows, next to its DRF case above
+    for serializer_class, queryset in (
+        (AthleteProfileSerializer, AthleteProfile.objects.order_by('-pk')),
+        (PledgeSerializer, Pledge.objects.order_by('-pk')),
+        (ProgressUpdateSerializer, ProgressUpdate.objects.order_by('-pk')),
+    ):
+        plan = plan_for(serializer_class, {})
+        if plan is None:
+            continue
+        rows = list(plan.values(queryset)[:size])
+        cases[f'{serializer_class.__name__} (compiled)'] = (rows, lambda plan=plan, rows=rows: plan.render(rows))
+    return {name: (len(objects), func) for name, (objects, func) in cases.items()}
+
+
+def run_serializers(iterations=50, size=100):
+    results = []
+    for name, (count, func) in serializer_cases(size).items():
+        timings = time_calls(func, iterations)
+        results.append({
+            'name': name,
+            'objects': count,
+            'iterations': iterations,
+            'latency_ms': percentiles(timings),
+            'objects_per_second': round(count * iterations / sum(timings), 1) if sum(timings) else 0,
+        })
+    return results
+
+
+def view_paths():
+    """
+    The read endpoints worth tracking, pointed at the busiest athlete so
+    nested data is realistic.
+    """
+    athlete_id = _busiest_athlete()
+    pledge_id = Pledge.objects.order_by('-pk').values_list('pk', flat=True).first()
+    paths = [
+        '/api/athletes/',
+        '/api/athletes/?sport=swimming&sort=most_funded',
+        '/api/athletes/search/?q=swimming+training',
+        '/api/athletes/leaderboard/',
+        '/api/athletes/trending/',
+        '/api/pledges/',
+        '/api/updates/',
+        '/api/async/athletes/',
+    ]
+    if athlete_id is not None:
+        paths[1:1] = [
+            f'/api/athletes/{athlete_id}/',
+            f'/api/athletes/{athlete_id}/pledges/',
+            f'/api/athletes/{athlete_id}/updates/',
+        ]
+    if pledge_id is not None:
+        paths.append(f'/api/pledges/{pledge_id}/')
+    return paths
+
+
+def run_views(paths, iterations=50, cache=False):
+    """
+    Requests each path in-process through the full middleware stack and
+    records latency and queries per request. The response cache is off
+    unless `cache` is set, so repeat requests measure the real work.
+    """
+    client = Client()
+    results = []
+    overrides = {} if cache else {'RESPONSE_CACHE': {'ENABLED': False}}
+    with override_settings(**overrides):
+        for path in paths:
+            statuses = {}
+            queries = []
+            timings = []
+            for number in range(iterations + 3):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    elapsed = time.perf_counter() - started
+                if number < 3:
+                    continue  # Warm-up
+                timings.append(elapsed)
+                queries.append(len(captured))
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            results.append({
+                'name': path,
+                'iterations': iterations,
+                'statuses': statuses,
+                'latency_ms': percentiles(timings),
+                'queries_per_request': round(sum(queries) / len(queries), 2),
+                'max_queries': max(queries),
+                'requests_per_second': round(iterations / sum(timings), 1) if sum(timings) else 0,
+                'response_bytes': len(response.content),
+            })
+    return results
+
+
+def run_encoding(paths, iterations=50):
+    """
+    For each path's response data: the time to encode it with DRF's
+    JSONRenderer and with FastJSONRenderer, and the body size and time to
+    compress it with each encoding the middleware can use.
+    """
+    client = Client()
+    config = compression_config()
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+    results = []
+    with override_settings(RESPONSE_CACHE={'ENABLED': False}):
+        for path in paths:
+            data = getattr(client.get(path), 'data', None)
+            if data is None:
+                continue
+            body = fast.render(data)
+            drf_timings = time_calls(lambda: drf.render(data), iterations)
+            timings = time_calls(lambda: fast.render(data), iterations)
+            sizes = {'identity': len(body)}
+            compress_ms = {}
+            for encoding in available_encodings():
+                sizes[encoding] = len(compress(body, encoding, config))
+                compress_ms[encoding] = percentiles(
+                    time_calls(lambda: compress(body, encoding, config), iterations),
+                )
+            results.append({
+                'name': path,
+                'iterations': iterations,
+                'latency_ms': percentiles(timings),
+                'drf_latency_ms': percentiles(drf_timings),
+                'megabytes_per_second': round(len(body) * iterations / sum(timings) / 1e6, 1) if sum(timings) else 0,
+                'bytes': sizes,
+                'compress_ms': compress_ms,
+            })
+    return results
+
+
+@contextlib.contextmanager
+def serve(port, workers=2, worker_class='uvicorn_worker.UvicornWorker', app='crowdfunding.asgi'):
+    """
+    Runs gunicorn on 127.0.0.1:`port` against the configured database for
+    the duration of the block.
+    """
+    command = [
+        sys.executable, '-m', 'gunicorn', f'{app}:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '-k', worker_class,
+        '--log-level', 'warning',
+    ]
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=os.environ.copy())
+    try:
+        _wait_for_port(port, process)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def run_load(host, port, path, concurrency, total, timeout, headers=()):
+    """
+    Sends `total` GETs for `path` from `concurrency` connections and returns
+    throughput, latency percentiles (ms) and error counts.
+    """
+    lines = [f'GET {path} HTTP/1.1', f'Host: {host}:{port}', 'Accept: application/json', *headers]
+    request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    remaining = [total]
+    latencies = []
+    statuses = {}
+    errors = []
+
+    async def client():
+        reader = writer = None
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                writer.write(request)
+                status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                errors.append(type(exc).__name__)
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(min(concurrency, total))])
+    elapsed = time.perf_counter() - started
+
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'latency_ms': percentiles(latencies),
+    }
+
+
+async def read_response(reader):
+    # Minimal HTTP/1.1 response reader: status, headers, then a
+    # Content-Length or chunked body, which is read and discarded
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    status = int(status_line.split(' ', 2)[1])
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+    return {
+        'mean': round(statistics.fmean(ordered) * 1000, 2),
+        'p50': at(0.50),
+        'p95': at(0.95),
+        'p99': at(0.99),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+def run_load_suite(base_url, paths, concurrency=50, requests=2000, timeout=30.0):
+    url = urlsplit(base_url)
+    results = []
+    for path in paths:
+        result = asyncio.run(run_load(url.hostname, url.port or 80, path, concurrency, requests, timeout))
+        result['name'] = result.pop('path')
+        results.append(result)
+    return results
+
+
+def environment():
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+        'dataset': {
+            'users': get_user_model().objects.count(),
+            'athletes': AthleteProfile.objects.count(),
+            'pledges': Pledge.objects.count(),
+            'updates': ProgressUpdate.objects.count(),
+        },
+    }
+
+
+def save_results(results, directory=RESULTS_DIR):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    meta = results['environment']
+    stamp = meta['created_at'].replace(':', '').replace('-', '')[:15]
+    name = f"{stamp}-{meta['commit'] or 'nocommit'}-{meta['database']}"
+    path = directory / f'{name}.json'
+    number = 1
+    while path.exists():
+        number += 1
+        path = directory / f'{name}-{number}.json'
+    path.write_text(json.dumps(results, indent=2))
+    return path
+
+
+def latest_results(directory=RESULTS_DIR):
+    files = sorted(
+        Path(directory).glob('*.json'),
+        key=lambda path: path.stat().st_mtime_ns,
+    )
+    return files[-1] if files else None
+
+
+def compare(before, after):
+    """
+    [(section, name, p50 before, p50 after, change)] for every case in both
+    runs. change is after / before: below 1 is faster.
+    """
+    rows = []
+    for section in ('serializers', 'views', 'encoding', 'load'):
+        previous = {case['name']: case for case in before.get(section, [])}
+        for case in after.get(section, []):
+            old = previous.get(case['name'])
+            if old is None:
+                continue
+            old_p50 = old['latency_ms'].get('p50')
+            new_p50 = case['latency_ms'].get('p50')
+            change = round(new_p50 / old_p50, 2) if old_p50 and new_p50 is not None else None
+            rows.append((section, case['name'], old_p50, new_p50, change))
+    return rows
+
+
+def _busiest_athlete():
+    return (
+        AthleteStats.objects.order_by('-pledge_count').values_list('athlete_profile_id', flat=True).first()
+        or AthleteProfile.objects.order_by('-pk').values_list('pk', flat=True).first()
+    )
+
+
+def _wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'gunicorn did not start listening on port {port}')
+
+
+def _git(*args):
+    try:
+        output = subprocess.run(
+            ['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10, check=True,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.strip()
@@ -0,0 +1,174 @@
+import codecs
+import csv
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import aggregates, rankings
+from .cache import FUNDING_TAG, invalidate_athletes
+from .models import AthleteProfile, Pledge
+from .serializers import (
+    CLOSED_CAMPAIGN_MESSAGE,
+    DONOR_ONLY_MESSAGE,
+    PLEDGE_ROLES,
+    PledgeSerializer,
+)
+
+MAX_REPORTED_ERRORS = 1000
+
+
+class PledgeRowSerializer(serializers.Serializer):
+    """
+    Field rules for one batch row. amount/comment/anonymous/is_fulfilled
+    are PledgeSerializer's own fields; the related ids are checked per
+    chunk in ingest_pledges so rows don't each query the database.
+    """
+    athlete_profile = serializers.IntegerField()
+    supporter = serializers.IntegerField()
+    date_created = serializers.DateTimeField(required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        pledge_fields = PledgeSerializer().get_fields()
+        for name in ['amount', 'comment', 'anonymous', 'is_fulfilled']:
+            fields[name] = pledge_fields[name]
+        return fields
+
+
+class IngestResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+
+def ingest_pledges(rows, batch_size=1000, dry_run=False, on_error=None):
+    """
+    Validates and inserts pledges from an iterable of dicts, one chunk at a
+    time so the input is never held in memory as a whole. Valid rows are
+    bulk inserted; funds_raised, AthleteStats and the response cache get one
+    update per athlete per chunk. Invalid rows are reported, not inserted.
+    """
+    result = IngestResult()
+    # One serializer validates every row, like ListSerializer does with its child
+    row_serializer = PledgeRowSerializer()
+    numbered = enumerate(rows, start=1)
+    while True:
+        chunk = list(islice(numbered, batch_size))
+        if not chunk:
+            break
+        _ingest_chunk(chunk, result, dry_run, on_error, row_serializer)
+    return result
+
+
+def _ingest_chunk(chunk, result, dry_run, on_error, row_serializer):
+    parsed = []
+    rejected = []
+    for row_number, row in chunk:
+        try:
+            parsed.append((row_number, row_serializer.run_validation(row)))
+        except serializers.ValidationError as exc:
+            rejected.append((row_number, exc.detail))
+
+    # Look up every athlete and supporter in the chunk at once
+    athletes = dict(
+        AthleteProfile.objects.filter(pk__in={data['athlete_profile'] for _, data in parsed})
+        .values_list('pk', 'is_open')
+    )
+    roles = dict(
+        get_user_model().objects.filter(pk__in={data['supporter'] for _, data in parsed})
+        .values_list('pk', 'role')
+    )
+
+    now = timezone.now()
+    pledges = []
+    totals = defaultdict(Decimal)
+    for row_number, data in parsed:
+        errors = _check_rules(data, athletes, roles)
+        if errors:
+            rejected.append((row_number, errors))
+            continue
+        pledges.append(Pledge(
+            athlete_profile_id=data['athlete_profile'],
+            supporter_id=data['supporter'],
+            amount=data['amount'],
+            comment=data.get('comment', ''),
+            anonymous=data.get('anonymous', False),
+            is_fulfilled=data.get('is_fulfilled', True),
+            date_created=data.get('date_created', now),
+        ))
+        totals[data['athlete_profile']] += data['amount']
+
+    if pledges and not dry_run:
+        with transaction.atomic():
+            # As Pledge.save() does, so supporter checks see committed pledges
+            AthleteProfile.lock(*totals)
+            deltas = aggregates.new_pledge_deltas(pledges)
+            Pledge.objects.bulk_create(pledges)
+            for athlete_id, total in totals.items():
+                AthleteProfile.adjust_funds(athlete_id, total)
+            for athlete_id, delta in deltas.items():
+                aggregates.apply_delta(athlete_id, **delta)
+            rankings.record_new_pledges(pledges)
+            invalidate_athletes(*totals, tags=['pledges', FUNDING_TAG])
+    result.created += len(pledges)
+
+    for row_number, errors in sorted(rejected, key=lambda item: item[0]):
+        result.add_error(row_number, errors)
+        if on_error is not None:
+            on_error(row_number, errors)
+
+
+def _check_rules(data, athletes, roles):
+    # Same rules PledgeSerializer.validate and Pledge.clean apply to one pledge
+    errors = {}
+    if data['supporter'] not in roles:
+        errors['supporter'] = ['Supporter not found.']
+    elif roles[data['supporter']] not in PLEDGE_ROLES:
+        errors['supporter'] = [DONOR_ONLY_MESSAGE]
+    if data['athlete_profile'] not in athletes:
+        errors['athlete_profile'] = ['Athlete profile not found.']
+    elif not athletes[data['athlete_profile']]:
+        errors['athlete_profile'] = [CLOSED_CAMPAIGN_MESSAGE]
+    if data['amount'] <= 0:
+        errors['amount'] = ['Pledge amount must be greater than zero.']
+    return errors
+
+
+def read_rows(stream, file_format):
+    """
+    Lazily yields row dicts from CSV (with a header row) or newline-delimited
+    JSON. `stream` is anything that iterates over lines: an open file, an
+    uploaded file or the request itself.
+    """
+    lines = stream if isinstance(stream, io.TextIOBase) else codecs.iterdecode(stream, 'utf-8-sig')
+
+    if file_format == 'csv':
+        for row in csv.DictReader(lines):
+            # Empty cells mean "use the default", not an empty value
+            yield {key: value for key, value in row.items() if value != ''}
+    elif file_format == 'ndjson':
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Passed on as-is so it is reported like any other invalid row
+                    yield line
+    else:
+        raise ValueError(f'Unsupported format: {file_format}')
@@ -0,0 +1,341 @@
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from . import routers
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'lru',  # 'lru' for in-process, 'django' for a shared Django cache
+    'ALIAS': 'default',  # Django cache alias used by the 'django' backend
+    'MAX_ENTRIES': 1024,
+    'TIMEOUT': 300,
+    'KEY_PREFIX': 'response',
+}
+
+
+class LRUCache:
+    """
+    In-process cache with a fixed number of entries, evicting the least
+    recently used one when full.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set(self, key, value, timeout=None):
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCache:
+    """
+    Shared backend on top of a Django cache alias (Redis, Memcached, ...),
+    so every worker sees the same entries and invalidations.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResponseCache:
+    """
+    Rendered GET responses tagged with the objects they contain. Each tag
+    has a version token; bumping it makes every entry stored under the old
+    token stale, which works the same on in-process and shared backends.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._backend_config = None
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+    @property
+    def enabled(self):
+        return self.config['ENABLED']
+
+    @property
+    def backend(self):
+        config = self.config
+        backend_config = (config['BACKEND'], config['ALIAS'], config['MAX_ENTRIES'])
+        if self._backend is None or self._backend_config != backend_config:
+            if config['BACKEND'] == 'django':
+                self._backend = DjangoCache(config['ALIAS'])
+            else:
+                self._backend = LRUCache(config['MAX_ENTRIES'])
+            self._backend_config = backend_config
+        return self._backend
+
+    def _key(self, *parts):
+        return ':'.join([self.config['KEY_PREFIX'], *parts])
+
+    def get(self, key):
+        entry = self.backend.get(self._key('entry', key))
+        if entry is None:
+            return None
+        tag_keys = {self._key('tag', tag): version for tag, version in entry['tags'].items()}
+        current = self.backend.get_many(list(tag_keys))
+        for tag_key, version in tag_keys.items():
+            if current.get(tag_key) != version:
+                return None
+        return entry
+
+    def set(self, key, entry, tags, from_replica=False):
+        """
+        Stores `entry` under the current version of each tag. Entries read
+        from a replica are dropped instead while any of their tags was
+        invalidated less than REPLICAS['PIN_SECONDS'] ago: the replica may
+        not have the write yet, and its stale body would otherwise be served
+        under the new version for the full TIMEOUT. Returns whether it was
+        stored.
+        """
+        tag_keys = {tag: self._key('tag', tag) for tag in tags}
+        current = self.backend.get_many(list(tag_keys.values()))
+        lagging_since = time.time() - routers.get_config()['PIN_SECONDS']
+        versions = {}
+        for tag, tag_key in tag_keys.items():
+            version = current.get(tag_key)
+            if version is None:
+                version = self._bump(tag_key, invalidated_at=0)
+            elif from_replica and _invalidated_at(version) > lagging_since:
+                return False
+            versions[tag] = version
+        entry['tags'] = versions
+        self.backend.set(self._key('entry', key), entry, self.config['TIMEOUT'])
+        return True
+
+    async def aget(self, key):
+        # The in-process backend never blocks; only a shared one needs a thread
+        if isinstance(self.backend, LRUCache):
+            return self.get(key)
+        return await sync_to_async(self.get)(key)
+
+    async def aset(self, key, entry, tags, from_replica=False):
+        if isinstance(self.backend, LRUCache):
+            return self.set(key, entry, tags, from_replica)
+        return await sync_to_async(self.set)(key, entry, tags, from_replica)
+
+    def invalidate(self, *tags):
+        """
+        Marks every entry tagged with any of `tags` as stale. Bumps once now
+        and again after the surrounding transaction commits, so a read racing
+        the write can't leave pre-commit data cached.
+        """
+        if not self.enabled:
+            return
+        self._invalidate(tags)
+        transaction.on_commit(lambda: self._invalidate(tags))
+
+    def _invalidate(self, tags):
+        for tag in tags:
+            self._bump(self._key('tag', tag))
+
+    def _bump(self, tag_key, invalidated_at=None):
+        # Tags outlive the entries that use them. A tag first seen by set()
+        # wasn't invalidated, so it gets no time.
+        if invalidated_at is None:
+            invalidated_at = time.time()
+        version = f'{invalidated_at:.3f}:{uuid.uuid4().hex}'
+        self.backend.set(tag_key, version, None)
+        return version
+
+    def clear(self):
+        self.backend.clear()
+
+
+def _invalidated_at(version):
+    # Versions written before invalidation times were recorded count as old
+    stamp, _, _ = version.rpartition(':')
+    return float(stamp or 0)
+
+
+response_cache = ResponseCache()
+
+
+# Listings whose membership or order depends on funding progress
+FUNDING_TAG = 'athletes:funding'
+
+
+def athlete_tag(pk):
+    return f'athlete:{pk}'
+
+
+def invalidate_athletes(*athlete_ids, tags=()):
+    response_cache.invalidate(*[athlete_tag(pk) for pk in athlete_ids], *tags)
+
+
+def cache_response(tags):
+    """
+    Caches the rendered output of an APIView get() method, sync or async.
+
+    `tags(request, data, *args, **kwargs)` returns the tags to file the
+    response under, along with any the view set in `view.cache_tags` (for
+    ids the rendered data may leave out, e.g. under ?fields=). Entries are
+    keyed on path, query string, negotiated format and the requesting
+    user, and carry an ETag and Last-Modified so conditional requests get
+    a 304 without touching the view.
+    """
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(view, request, *args, **kwargs):
+                if not response_cache.enabled:
+                    return await method(view, request, *args, **kwargs)
+
+                key = _request_key(request)
+                entry = await response_cache.aget(key)
+                if entry is not None:
+                    return _cached_response(request, entry)
+
+                response = await method(view, request, *args, **kwargs)
+                if not _cacheable(response):
+                    return response
+                response, entry = _render(view, request, response, *args, **kwargs)
+                await response_cache.aset(
+                    key, entry, _tags(tags, view, request, response, args, kwargs),
+                    from_replica=routers.read_alias() is not None,
+                )
+                return _conditional_response(request, entry, response)
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not response_cache.enabled:
+                return method(view, request, *args, **kwargs)
+
+            key = _request_key(request)
+            entry = response_cache.get(key)
+            if entry is not None:
+                return _cached_response(request, entry)
+
+            response = method(view, request, *args, **kwargs)
+            if not _cacheable(response):
+                return response
+            response, entry = _render(view, request, response, *args, **kwargs)
+            response_cache.set(
+                key, entry, _tags(tags, view, request, response, args, kwargs),
+                from_replica=routers.read_alias() is not None,
+            )
+            return _conditional_response(request, entry, response)
+        return wrapper
+    return decorator
+
+
+def _tags(tags, view, request, response, args, kwargs):
+    return {*tags(request, response.data, *args, **kwargs), *getattr(view, 'cache_tags', ())}
+
+
+def _cacheable(response):
+    return isinstance(response, Response) and response.status_code == 200
+
+
+def _render(view, request, response, *args, **kwargs):
+    # Render now so the bytes can be stored, dispatch() won't re-render
+    response = view.finalize_response(request, response, *args, **kwargs)
+    response.render()
+    entry = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': '"%s"' % hashlib.md5(response.content).hexdigest(),
+        'last_modified': int(time.time()),
+    }
+    return response, entry
+
+
+def _request_key(request):
+    user = request.user
+    auth = f'user:{user.pk}' if user and user.is_authenticated else 'anon'
+    renderer = getattr(request, 'accepted_media_type', '')
+    raw = '|'.join([request.get_full_path(), renderer, auth])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _cached_response(request, entry):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    return _conditional_response(request, entry, response)
+
+
+def _conditional_response(request, entry, response):
+    _add_validators(response, entry)
+    not_modified = get_conditional_response(
+        request._request,
+        etag=entry['etag'],
+        last_modified=entry['last_modified'],
+        response=response,
+    )
+    return not_modified or response
+
+
+def _add_validators(response, entry):
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_vary_headers(response, ['Authorization', 'Cookie'])
@@ -0,0 +1,196 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+
+from . import metrics
+
+DEFAULTS = {
+    'ENABLED': True,
+}
+
+# Fields whose to_representation returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ReadOnlyField,
+)
+# Plans kept per process, one per serializer class and fieldset. Fieldsets
+# come from clients, so past this many the rest are built per request.
+PLAN_CACHE_SIZE = 256
+_plans = {}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'COMPILED_SERIALIZERS', {})}
+
+
+class NotCompilable(Exception):
+    pass
+
+
+class Plan:
+    """
+    A read-only serializer turned into one generated function that maps
+    values() rows to the dicts the serializer would produce, field for
+    field and in the same order, without creating serializer objects or
+    model instances per row.
+
+    Embedded many=True fields are read from row[name], already rendered:
+    the caller fetches them (with the child plan in `lists`) before
+    calling render().
+    """
+
+    def __init__(self, serializer):
+        self.names = list(serializer.fields)
+        self.columns = []
+        self.lists = {}
+        namespace = {}
+        expression = self._compile(serializer, serializer.Meta.model, '', namespace, top=True)
+        source = f'def render(rows):\n    return [{expression} for row in rows]\n'
+        exec(compile(source, f'<compiled {type(serializer).__name__}>', 'exec'), namespace)
+        self.source = source
+        self._render = namespace['render']
+
+    def values(self, queryset, ordering=()):
+        # The columns the plan reads, plus those a keyset cursor needs
+        extra = [name.lstrip('-') for name in ordering]
+        return queryset.values(*dict.fromkeys([*self.columns, *extra]))
+
+    def render(self, rows):
+        started = time.perf_counter()
+        data = self._render(rows)
+        metrics.add_serializer_time(time.perf_counter() - started)
+        return data
+
+    def _compile(self, serializer, model, prefix, namespace, top=False):
+        items = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                if not top:
+                    raise NotCompilable(f'{name}: lists are only embedded at the top level')
+                self.lists[name] = Plan(field.child)
+                items.append(f'{name!r}: row[{name!r}]')
+                continue
+            if field.source == '*' or isinstance(field, (serializers.SerializerMethodField, serializers.ManyRelatedField)):
+                raise NotCompilable(f'{name}: {type(field).__name__} needs model instances')
+
+            column = prefix + '__'.join(field.source_attrs)
+            model_field = _model_field(model, field.source_attrs)
+            if isinstance(field, serializers.BaseSerializer):
+                # Nested object, e.g. ?expand=athlete_profile: its columns through the join
+                if model_field is None or not model_field.is_relation or not model_field.concrete:
+                    raise NotCompilable(f'{name}: only forward relations can be nested')
+                nested = self._compile(field, model_field.related_model, column + '__', namespace)
+                if model_field.null:
+                    self.columns.append(column)
+                    nested = f'(None if row[{column!r}] is None else {nested})'
+                items.append(f'{name!r}: {nested}')
+                continue
+            if model_field is None and len(field.source_attrs) > 1:
+                raise NotCompilable(f'{name}: {field.source} is not a model field')
+
+            # Anything else is a column, or an annotation the caller adds
+            self.columns.append(column)
+            convert = converter(field)
+            if convert is None:
+                items.append(f'{name!r}: row[{column!r}]')
+            else:
+                name_in_code = f'_convert_{len(namespace)}'
+                namespace[name_in_code] = convert
+                items.append(f'{name!r}: (None if (value := row[{column!r}]) is None else {name_in_code}(value))')
+        return '{' + ', '.join(items) + '}'
+
+
+def converter(field):
+    """
+    The function turning a non-null column value into what
+    field.to_representation returns, or None when that is the value itself.
+    Decimals and datetimes in the usual shape skip DRF's general checks;
+    anything else goes through field.to_representation.
+    """
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    if isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None:
+        return None  # values() already gives the id
+    fallback = field.to_representation
+
+    if isinstance(field, serializers.DecimalField):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+            return fallback
+        exponent = -field.decimal_places
+
+        def convert_decimal(value):
+            # Already at the field's places (as the database returns it), so quantize is a no-op
+            if type(value) is Decimal and value.as_tuple().exponent == exponent:
+                return format(value, 'f')
+            return fallback(value)
+        return convert_decimal
+
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, 'timezone'):
+            return fallback
+        if not settings.USE_TZ:
+            return fallback
+
+        def convert_datetime(value):
+            if value.tzinfo is None:
+                return fallback(value)
+            text = value.astimezone(timezone.get_current_timezone()).isoformat()
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+        return convert_datetime
+
+    return fallback
+
+
+def plan_for(serializer_class, fieldset):
+    """
+    The Plan for serializer_class with the given fields/expand, or None
+    when compiled serializers are off or the serializer has fields a plan
+    can't reproduce (the view then serializes with DRF). Plans are built
+    once per process and fieldset.
+    """
+    if not get_config()['ENABLED']:
+        return None
+    key = (serializer_class, _freeze(fieldset))
+    try:
+        return _plans[key]
+    except KeyError:
+        pass
+    # Bad ?fields= raise here, a 400 like on the DRF path
+    serializer = serializer_class(**fieldset)
+    try:
+        plan = Plan(serializer)
+    except NotCompilable:
+        plan = None
+    if len(_plans) < PLAN_CACHE_SIZE:
+        _plans[key] = plan
+    return plan
+
+
+def _freeze(selection):
+    return tuple(sorted((name, _freeze(nested)) for name, nested in selection.items()))
+
+
+def _model_field(model, attrs):
+    # The model field a dotted source ends on, None if it isn't one
+    field = None
+    for attr in attrs:
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model if field.is_relation else None
+    return field
@@ -0,0 +1,171 @@
+import gzip
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,  # Smaller bodies go out as they are; compressing them saves next to nothing
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,  # 0-11; past 5 gets slow for a small gain on JSON
+    # Only data formats: HTML pages (the browsable API) carry CSRF tokens,
+    # which compression would expose to BREACH
+    'CONTENT_TYPES': ['application/json', 'text/csv', 'application/x-ndjson'],
+    'CACHE_ENTRIES': 256,  # Compressed bodies kept per worker for responses with an ETag
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+
+
+def available_encodings():
+    # In order of preference when the client accepts several equally
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def pick_encoding(accept_encoding, available):
+    """
+    The encoding from `available` the Accept-Encoding header rates highest,
+    or None to send the body as it is.
+
+        pick_encoding('gzip, br;q=0.8', ('br', 'gzip')) -> 'gzip'
+    """
+    ratings = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            ratings[name] = quality
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = ratings.get(encoding, ratings.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(content, quality=config['BROTLI_QUALITY'])
+    # mtime=0 so the same body always compresses to the same bytes
+    return gzip.compress(content, compresslevel=config['GZIP_LEVEL'], mtime=0)
+
+
+def compressor(encoding, config):
+    # (compress a chunk and flush it, finish) for streamed bodies
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=config['BROTLI_QUALITY'])
+        return (lambda chunk: stream.process(chunk) + stream.flush()), stream.finish
+    stream = zlib.compressobj(config['GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (lambda chunk: stream.compress(chunk) + stream.flush(zlib.Z_SYNC_FLUSH)), stream.flush
+
+
+def compress_sequence(chunks, encoding, config):
+    process, finish = compressor(encoding, config)
+    for chunk in chunks:
+        if chunk:
+            yield process(chunk)
+    yield finish()
+
+
+async def acompress_sequence(chunks, encoding, config):
+    process, finish = compressor(encoding, config)
+    async for chunk in chunks:
+        if chunk:
+            yield process(chunk)
+    yield finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses API responses with brotli (when installed) or gzip, whichever
+    the client's Accept-Encoding prefers. Streamed exports are compressed
+    chunk by chunk, flushing each so clients still get rows as they come.
+
+    Cached responses carry the ETag of their body, so their compressed form
+    is kept and reused instead of compressing the same bytes every hit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.encodings = available_encodings()
+        self.compressed = LRUCache(self.config['CACHE_ENTRIES'])
+        self.is_async = iscoroutinefunction(self.get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        config = self.config
+        if not config['ENABLED'] or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').partition(';')[0].strip().lower()
+        if content_type not in config['CONTENT_TYPES']:
+            return response
+        if not response.streaming and len(response.content) < config['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = pick_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_sequence(response.streaming_content, encoding, config)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content, encoding, config)
+            # Unknown until it has all been sent
+            response.headers.pop('Content-Length', None)
+        else:
+            content = self.compress(response, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        # The body changed, so a strong ETag becomes weak (If-None-Match still matches it)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress(self, response, encoding):
+        etag = response.get('ETag')
+        if not etag:
+            return compress(response.content, encoding, self.config)
+        key = (etag, encoding)
+        content = self.compressed.get(key)
+        if content is None:
+            content = compress(response.content, encoding, self.config)
+            self.compressed.set(key, content)
+        return content
@@ -0,0 +1,113 @@
+import csv
+from datetime import datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import AthleteProfile, Pledge
+
+CHUNK_SIZE = 2000
+# Rows joined into each chunk written to the client
+LINES_PER_WRITE = 200
+
+PLEDGE_COLUMNS = [
+    'id', 'athlete_profile', 'supporter', 'amount', 'anonymous', 'is_fulfilled', 'date_created',
+]
+ATHLETE_COLUMNS = [
+    'id', 'first_name', 'last_name', 'sport', 'goal', 'funds_raised', 'is_open',
+    'pledge_count', 'supporter_count', 'last_pledge_at', 'date_created',
+]
+
+
+def pledge_rows(chunk_size=CHUNK_SIZE):
+    rows = Pledge.objects.order_by('pk').values_list(
+        'id', 'athlete_profile_id', 'supporter_id', 'amount', 'anonymous', 'is_fulfilled', 'date_created',
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        if row[4]:
+            # Anonymous pledges never name their supporter
+            row = (row[0], row[1], None, *row[3:])
+        yield row
+
+
+def athlete_rows(chunk_size=CHUNK_SIZE):
+    rows = AthleteProfile.objects.order_by('pk').values_list(
+        'id', 'first_name', 'last_name', 'sport', 'goal', 'funds_raised', 'is_open',
+        'stats__pledge_count', 'stats__supporter_count', 'stats__last_pledge_at', 'date_created',
+    )
+    return rows.iterator(chunk_size=chunk_size)
+
+
+EXPORTS = {
+    'pledges': (PLEDGE_COLUMNS, pledge_rows),
+    'athletes': (ATHLETE_COLUMNS, athlete_rows),
+}
+
+
+class _Echo:
+    # csv.writer target that hands back each formatted line
+    def write(self, value):
+        return value
+
+
+def render_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def render_ndjson(columns, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+# ?output= / --format name: (content type, renderer)
+FORMATS = {
+    'csv': ('text/csv', render_csv),
+    'ndjson': ('application/x-ndjson', render_ndjson),
+}
+
+
+def export_lines(kind, file_format, chunk_size=CHUNK_SIZE):
+    """
+    Lazily yields the export as text lines. Rows are read with a chunked
+    iterator, so memory stays flat however big the table is.
+    """
+    columns, rows = EXPORTS[kind]
+    render = FORMATS[file_format][1]
+    return render(columns, rows(chunk_size))
+
+
+def iter_chunks(lines, size=LINES_PER_WRITE):
+    lines = iter(lines)
+    while True:
+        chunk = ''.join(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def aiter_chunks(lines, size=LINES_PER_WRITE):
+    # For ASGI: Django would read a sync iterator into a list before sending
+    # it, so pull each chunk in a worker thread instead
+    chunks = iter_chunks(lines, size)
+    next_chunk = sync_to_async(lambda: next(chunks, None))
+    while True:
+        chunk = await next_chunk()
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime):
+        # Same format as the JSON API and the NDJSON export
+        return DjangoJSONEncoder().default(value)
+    return value
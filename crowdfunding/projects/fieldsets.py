@@ -0,0 +1,118 @@
+from rest_framework import serializers
+
+# Query parameters read by requested()
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse(value):
+    """
+    'id,pledges.id,pledges.amount' -> {'id': {}, 'pledges': {'id': {}, 'amount': {}}}
+    """
+    selection = {}
+    for path in value.split(','):
+        node = selection
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return selection
+
+
+def requested(request):
+    """
+    The fields/expand keyword arguments for a SparseFieldsMixin serializer
+    (and plan_queryset) from ?fields= and ?expand=. Empty when the client
+    asked for neither, so the serializer stays as it is.
+    """
+    kwargs = {}
+    for param in (FIELDS_PARAM, EXPAND_PARAM):
+        value = request.query_params.get(param)
+        if value:
+            kwargs[param] = parse(value)
+    return kwargs
+
+
+def requested_columns(request, names):
+    """
+    The names ?fields= picks out of `names` (in that order), for views that
+    render flat rows rather than a SparseFieldsMixin serializer. All of them
+    when ?fields= is absent; nested picks, ?expand= and unknown names are a
+    400, as they are for the serializers.
+    """
+    fieldset = requested(request)
+    if EXPAND_PARAM in fieldset:
+        raise serializers.ValidationError({EXPAND_PARAM: 'Nothing here can be expanded.'})
+    selection = fieldset.get(FIELDS_PARAM)
+    if not selection:
+        return list(names)
+    unknown = set(selection) - set(names)
+    if unknown:
+        raise serializers.ValidationError({FIELDS_PARAM: f'Unknown field(s): {", ".join(sorted(unknown))}.'})
+    nested = sorted(name for name, picked in selection.items() if picked)
+    if nested:
+        raise serializers.ValidationError({FIELDS_PARAM: f'"{nested[0]}" has no fields to pick.'})
+    return [name for name in names if name in selection]
+
+
+class SparseFieldsMixin:
+    """
+    Lets the caller pick the fields a serializer renders and expand related
+    ids into nested objects:
+
+        PledgeSerializer(pledges, many=True, fields={'id': {}, 'athlete_profile': {'first_name': {}}},
+                         expand={'athlete_profile': {}})
+
+    Expandable fields are listed in Meta.expandable_fields as
+    {name: (serializer class, kwargs)}. Nested serializers take dotted
+    selections (pledges.amount). Unknown and write-only names are a 400.
+
+    Restricted serializers are marked `sparse`, which tells plan_queryset
+    to load only the columns they read.
+    """
+    sparse = False
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if expand:
+            expand_fields(self, expand, EXPAND_PARAM)
+        if fields:
+            restrict_fields(self, fields, FIELDS_PARAM)
+
+
+def expand_fields(serializer, selection, path):
+    expandable = getattr(getattr(serializer, 'Meta', None), 'expandable_fields', {})
+    for name, nested in selection.items():
+        field = serializer.fields.get(name)
+        if name in expandable:
+            serializer_class, kwargs = expandable[name]
+            serializer.fields[name] = serializer_class(read_only=True, expand=nested, **kwargs)
+        elif _nested(field) is not None and nested:
+            expand_fields(_nested(field), nested, f'{path}.{name}')
+        else:
+            raise serializers.ValidationError({path: f'"{name}" cannot be expanded.'})
+
+
+def restrict_fields(serializer, selection, path):
+    # Write-only fields (passwords) are never rendered, so they can't be picked either
+    readable = {name for name, field in serializer.fields.items() if not field.write_only}
+    unknown = set(selection) - readable
+    if unknown:
+        raise serializers.ValidationError({path: f'Unknown field(s): {", ".join(sorted(unknown))}.'})
+    for name in list(serializer.fields):
+        if name not in selection:
+            serializer.fields.pop(name)
+        elif selection[name]:
+            nested = _nested(serializer.fields[name])
+            if nested is None:
+                raise serializers.ValidationError({path: f'"{name}" has no fields to pick.'})
+            restrict_fields(nested, selection[name], f'{path}.{name}')
+    serializer.sparse = True
+
+
+def _nested(field):
+    # The serializer rendering each item of a nested field, if it is one
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
@@ -0,0 +1,87 @@
+from rest_framework import serializers
+
+from .rankings import LEADERBOARDS, SNAPSHOT_SIZE, TRENDING_WINDOWS
+
+# ?sort= keys for the athlete list, each a unique keyset ordering
+ATHLETE_SORTS = {
+    'newest': ('-date_created', '-id'),
+    'most_funded': ('-funds_raised', '-id'),
+    'percent_funded': ('-percent_funded', '-id'),
+    'closest_to_goal': ('funds_to_goal', 'id'),
+}
+
+# Sorts whose order moves whenever a pledge comes in
+FUNDING_SORTS = {'most_funded', 'percent_funded', 'closest_to_goal'}
+
+
+class AthleteFilterSerializer(serializers.Serializer):
+    """
+    Query parameters accepted by the athlete list.
+    """
+    sport = serializers.CharField(required=False)
+    is_open = serializers.BooleanField(required=False, allow_null=True, default=None)
+    min_age = serializers.IntegerField(required=False, min_value=0)
+    max_age = serializers.IntegerField(required=False, min_value=0)
+    min_funded = serializers.DecimalField(max_digits=9, decimal_places=2, required=False)
+    max_funded = serializers.DecimalField(max_digits=9, decimal_places=2, required=False)
+    sort = serializers.ChoiceField(choices=list(ATHLETE_SORTS), default='newest')
+
+    def validate(self, data):
+        if data.get('min_age') is not None and data.get('max_age') is not None:
+            if data['min_age'] > data['max_age']:
+                raise serializers.ValidationError({'min_age': 'min_age cannot be above max_age.'})
+        return data
+
+    @property
+    def depends_on_funding(self):
+        # Whether pledges to any athlete can change which rows match
+        data = self.validated_data
+        return (
+            data['sort'] in FUNDING_SORTS
+            or data.get('min_funded') is not None
+            or data.get('max_funded') is not None
+        )
+
+
+def filter_athletes(queryset, filters):
+    """
+    Applies validated AthleteFilterSerializer data to an AthleteProfile
+    queryset. Funding progress is filtered in SQL. Returns the queryset and
+    the keyset ordering to page it with.
+    """
+    if filters.get('sport'):
+        queryset = queryset.filter(sport=filters['sport'])
+    if filters.get('is_open') is not None:
+        queryset = queryset.filter(is_open=filters['is_open'])
+    if filters.get('min_age') is not None:
+        queryset = queryset.filter(age__gte=filters['min_age'])
+    if filters.get('max_age') is not None:
+        queryset = queryset.filter(age__lte=filters['max_age'])
+
+    # percent_funded and funds_to_goal are stored on the row (kept with
+    # funds_raised) and indexed
+    sort = filters.get('sort', 'newest')
+    if filters.get('min_funded') is not None:
+        queryset = queryset.filter(percent_funded__gte=filters['min_funded'])
+    if filters.get('max_funded') is not None:
+        queryset = queryset.filter(percent_funded__lte=filters['max_funded'])
+
+    return queryset, ATHLETE_SORTS[sort]
+
+
+class AthleteSearchSerializer(serializers.Serializer):
+    """
+    Query parameters accepted by the athlete search.
+    """
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    board = serializers.ChoiceField(choices=list(LEADERBOARDS), default='most_funded')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class TrendingSerializer(serializers.Serializer):
+    window = serializers.ChoiceField(choices=list(TRENDING_WINDOWS), default='24h')
+    limit = serializers.IntegerField(min_value=1, max_value=SNAPSHOT_SIZE, default=10)
@@ -0,0 +1,114 @@
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import models
+
+DEFAULTS = {
+    'HEADER': 'Idempotency-Key',
+    'TTL_SECONDS': 86400,  # How long a key's response can be replayed
+}
+MAX_KEY_LENGTH = 255
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def fingerprint(request):
+    # The same key must come with the same request to be a retry
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def idempotent(method):
+    """
+    Makes an APIView write method safe to retry. A request with an
+    Idempotency-Key header runs once per user and key; retries within
+    TTL_SECONDS get the stored response back (with Idempotent-Replayed: true)
+    without running the view again.
+
+    The key is claimed in the same transaction as the view's writes, so a
+    retry sent while the first request is still running waits for it to
+    commit and then replays it, on any worker. If the first request fails
+    (an exception or a 5xx) nothing is stored and a retry runs the view.
+    """
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        config = get_config()
+        key = request.headers.get(config['HEADER'])
+        if key is None or not request.user.is_authenticated:
+            return method(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"{config['HEADER']} must be 1 to {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        digest = fingerprint(request)
+        while True:
+            response = _run_once(view, method, request, key, digest, config, args, kwargs)
+            if response is not None:
+                return response
+    return wrapper
+
+
+def _run_once(view, method, request, key, digest, config, args, kwargs):
+    # The response, or None when another request holds the key (look again)
+    now = timezone.now()
+    stored = models.IdempotencyKey.objects.filter(supporter=request.user, key=key).first()
+    if stored is not None:
+        if stored.expires_at > now:
+            return _replay(stored, digest)
+        models.IdempotencyKey.objects.filter(pk=stored.pk, expires_at__lte=now).delete()
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                # A concurrent request with this key blocks here until we commit
+                record = models.IdempotencyKey.objects.create(
+                    supporter=request.user, key=key, fingerprint=digest, status_code=0, content=b'',
+                    expires_at=now + datetime.timedelta(seconds=config['TTL_SECONDS']),
+                )
+        except IntegrityError:
+            return None
+
+        response = method(view, request, *args, **kwargs)
+        if response.status_code >= 500:
+            transaction.set_rollback(True)
+            return response
+        # Render now so the exact bytes can be stored, dispatch() won't re-render
+        response = view.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        record.status_code = response.status_code
+        record.content_type = response['Content-Type']
+        record.content = response.content
+        record.save(update_fields=['status_code', 'content_type', 'content'])
+        return response
+
+
+def _replay(stored, digest):
+    if stored.fingerprint != digest:
+        return Response(
+            {"error": "This Idempotency-Key was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = HttpResponse(bytes(stored.content), content_type=stored.content_type, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def purge_expired():
+    deleted, _ = models.IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,217 @@
+import datetime
+import threading
+import time
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import idempotency, models
+
+DEFAULTS = {
+    'EAGER': False,  # Run jobs in-process right after the enqueuing transaction commits
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY_SECONDS': 10,  # Doubled after each failed attempt
+    'MAX_RETRY_DELAY_SECONDS': 3600,
+    'KEEP_FINISHED_DAYS': 7,
+}
+
+# name -> function, filled by @handler
+HANDLERS = {}
+
+# Set while run_pending is draining the queue in this thread
+_local = threading.local()
+
+
+class LeaseLost(Exception):
+    """The job's lease ran out and another worker claimed it."""
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'JOBS', {})}
+
+
+def handler(name):
+    """
+    Registers a function as the handler for jobs called `name`. It is
+    called with the job payload as keyword arguments, inside the transaction
+    that marks the job done, and may run more than once: make it idempotent
+    (apply_once helps when it applies deltas).
+    """
+    def register(func):
+        HANDLERS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=None, max_attempts=None):
+    """
+    Adds a job. Call it inside the transaction that makes the job necessary:
+    the job is committed with that data or not at all. While a job with the
+    same `key` is still waiting to run, enqueueing it again is a no-op.
+    """
+    config = get_config()
+    job = models.Job(
+        name=name,
+        payload=payload or {},
+        idempotency_key=key,
+        run_after=timezone.now() + (delay or datetime.timedelta()),
+        max_attempts=max_attempts or config['MAX_ATTEMPTS'],
+    )
+    models.Job.objects.bulk_create([job], ignore_conflicts=True)
+    if config['EAGER']:
+        # robust: a failing drain must not turn the committed write into an error
+        transaction.on_commit(run_pending, robust=True)
+
+
+def apply_once(key):
+    """
+    Records that the job with this key made its changes. True the first
+    time, False when a run of it already committed. Call it from the
+    handler, so the record commits or rolls back with the handler's work.
+    """
+    try:
+        with transaction.atomic():
+            models.AppliedJob.objects.create(key=key)
+    except IntegrityError:
+        return False
+    return True
+
+
+def claim(limit=1):
+    """
+    Takes up to `limit` due jobs for this worker: queued ones whose time has
+    come and running ones whose lease expired (their worker died). Each claim
+    counts as an attempt.
+    """
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    lease = datetime.timedelta(seconds=get_config()['LEASE_SECONDS'])
+    due = (
+        Q(status=models.Job.QUEUED, run_after__lte=now)
+        | Q(status=models.Job.RUNNING, locked_until__lt=now)
+    )
+    with transaction.atomic():
+        # skip_locked lets Postgres workers pass over each other's rows; the
+        # conditional UPDATE below is what makes a claim exclusive everywhere
+        candidates = list(
+            models.Job.objects.select_for_update(skip_locked=True)
+            .filter(due).order_by('run_after', 'id').values_list('pk', flat=True)[:limit]
+        )
+        if not candidates:
+            return []
+        models.Job.objects.filter(due, pk__in=candidates).update(
+            status=models.Job.RUNNING,
+            locked_by=token,
+            locked_until=now + lease,
+            attempts=F('attempts') + 1,
+        )
+    return list(models.Job.objects.filter(locked_by=token).order_by('run_after', 'id'))
+
+
+def run_job(job):
+    """
+    Runs one claimed job. Returns True when it finished, False when it
+    failed (it is retried with backoff until max_attempts) or was taken over.
+    """
+    func = HANDLERS.get(job.name)
+    try:
+        with transaction.atomic():
+            if func is None:
+                raise LookupError(f'No handler registered for {job.name!r}.')
+            func(**job.payload)
+            finished = models.Job.objects.filter(
+                pk=job.pk, status=models.Job.RUNNING, locked_by=job.locked_by,
+            ).update(status=models.Job.DONE, finished_at=timezone.now(), locked_until=None, last_error='')
+            if not finished:
+                # Roll the handler's work back, the new owner will redo it
+                raise LeaseLost()
+    except LeaseLost:
+        return False
+    except Exception:
+        _retry_or_fail(job, traceback.format_exc())
+        return False
+    return True
+
+
+def _retry_or_fail(job, error):
+    config = get_config()
+    mine = models.Job.objects.filter(pk=job.pk, status=models.Job.RUNNING, locked_by=job.locked_by)
+    if job.attempts >= job.max_attempts:
+        mine.update(status=models.Job.FAILED, finished_at=timezone.now(), locked_until=None, last_error=error)
+        return
+    delay = min(
+        config['RETRY_DELAY_SECONDS'] * 2 ** (job.attempts - 1),
+        config['MAX_RETRY_DELAY_SECONDS'],
+    )
+    try:
+        with transaction.atomic():
+            mine.update(
+                status=models.Job.QUEUED,
+                run_after=timezone.now() + datetime.timedelta(seconds=delay),
+                locked_until=None,
+                last_error=error,
+            )
+    except IntegrityError:
+        # The same work was queued again meanwhile and will run in its place
+        mine.update(status=models.Job.DONE, finished_at=timezone.now(), locked_until=None, last_error=error)
+
+
+def run_pending(limit=None):
+    """
+    Runs every job that is due right now in this process, including ones
+    the jobs themselves enqueue. Returns how many ran. Used by EAGER mode and
+    by tests.
+    """
+    if getattr(_local, 'draining', False):
+        return 0
+    _local.draining = True
+    count = 0
+    try:
+        while limit is None or count < limit:
+            jobs = claim(limit=10)
+            if not jobs:
+                break
+            for job in jobs:
+                run_job(job)
+                count += 1
+    finally:
+        _local.draining = False
+    return count
+
+
+def work(batch_size=10, poll_interval=1.0, should_stop=lambda: False, once=False, on_job=None):
+    """
+    Worker loop: claims and runs due jobs until `should_stop()` is true, or
+    until the queue is empty when `once` is set. Finished jobs and expired
+    idempotency keys are purged about once an hour.
+    """
+    last_purge = None
+    while not should_stop():
+        jobs = claim(limit=batch_size)
+        for job in jobs:
+            succeeded = run_job(job)
+            if on_job is not None:
+                on_job(job, succeeded)
+        if jobs:
+            continue
+        if last_purge is None or time.monotonic() - last_purge > 3600:
+            purge_finished()
+            idempotency.purge_expired()
+            last_purge = time.monotonic()
+        if once:
+            break
+        time.sleep(poll_interval)
+
+
+def purge_finished(days=None):
+    # Failed jobs are kept for inspection; retry or delete them from the admin
+    days = get_config()['KEEP_FINISHED_DAYS'] if days is None else days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = models.Job.objects.filter(status=models.Job.DONE, finished_at__lt=cutoff).delete()
+    models.AppliedJob.objects.filter(applied_at__lt=cutoff).delete()
+    return deleted
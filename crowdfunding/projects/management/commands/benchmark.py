@@ -0,0 +1,127 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import benchmarks
+from projects.models import AthleteProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks every serializer and read endpoint against the configured '
+        'database (SQLite, or Postgres through DATABASE_URL), optionally drives '
+        'concurrent load at a local gunicorn, and saves the results as JSON so '
+        'runs can be compared across commits. Seed data first with seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', action='append', choices=['serializers', 'views', 'encoding', 'load'],
+            help=(
+                'Sections to run (can be repeated). Default: serializers, views and encoding, '
+                'plus load with --load.'
+            ),
+        )
+        parser.add_argument('--iterations', type=int, default=50, help='Timed runs per serializer and view.')
+        parser.add_argument('--size', type=int, default=100, help='Objects per serializer call.')
+        parser.add_argument('--path', action='append', dest='paths', help='Endpoint to benchmark (can be repeated).')
+        parser.add_argument('--with-cache', action='store_true', help='Leave the response cache on for views.')
+
+        parser.add_argument('--load', action='store_true', help='Also run the concurrent load driver.')
+        parser.add_argument('--url', help='Load an already running server instead of starting gunicorn.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--worker-class', default='uvicorn_worker.UvicornWorker')
+        parser.add_argument('--wsgi', action='store_true', help='Serve crowdfunding.wsgi with sync workers.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000, help='Load requests per path.')
+
+        parser.add_argument('--output-dir', default=str(benchmarks.RESULTS_DIR))
+        parser.add_argument('--no-save', action='store_true')
+        parser.add_argument(
+            '--compare', nargs='?', const='latest',
+            help='Compare with a saved results file (default: the latest one in --output-dir).',
+        )
+
+    def handle(self, *args, **options):
+        if not AthleteProfile.objects.exists():
+            raise CommandError('No athletes to benchmark. Run `manage.py seed_data` first.')
+        sections = options['only'] or ['serializers', 'views', 'encoding'] + (['load'] if options['load'] else [])
+        paths = options['paths'] or benchmarks.view_paths()
+        output_dir = Path(options['output_dir'])
+        previous = self.previous_results(options['compare'], output_dir)
+
+        results = {'environment': benchmarks.environment()}
+        if 'serializers' in sections:
+            results['serializers'] = benchmarks.run_serializers(options['iterations'], options['size'])
+            self.write_cases('Serializers', results['serializers'], 'objects_per_second', 'obj/s')
+        if 'views' in sections:
+            results['views'] = benchmarks.run_views(paths, options['iterations'], options['with_cache'])
+            self.write_cases('Views (in-process)', results['views'], 'requests_per_second', 'req/s')
+        if 'encoding' in sections:
+            results['encoding'] = benchmarks.run_encoding(paths, options['iterations'])
+            self.write_encoding(results['encoding'])
+        if 'load' in sections:
+            results['load'] = self.run_load(paths, options)
+            self.write_cases('Load', results['load'], 'requests_per_second', 'req/s')
+
+        if not options['no_save']:
+            saved = benchmarks.save_results(results, output_dir)
+            self.stdout.write(self.style.SUCCESS(f'Saved {saved}'))
+        if previous is not None:
+            self.write_comparison(previous, results)
+
+    def previous_results(self, compare, output_dir):
+        if compare is None:
+            return None
+        path = benchmarks.latest_results(output_dir) if compare == 'latest' else Path(compare)
+        if path is None or not path.exists():
+            raise CommandError(f'No results to compare with ({compare}).')
+        self.stdout.write(f'Comparing with {path}')
+        return json.loads(path.read_text())
+
+    def run_load(self, paths, options):
+        settings = dict(
+            concurrency=options['concurrency'], requests=options['requests'],
+        )
+        if options['url']:
+            return benchmarks.run_load_suite(options['url'], paths, **settings)
+        app = 'crowdfunding.wsgi' if options['wsgi'] else 'crowdfunding.asgi'
+        worker_class = 'sync' if options['wsgi'] else options['worker_class']
+        with benchmarks.serve(options['port'], options['workers'], worker_class, app) as base_url:
+            return benchmarks.run_load_suite(base_url, paths, **settings)
+
+    def write_cases(self, title, cases, rate_key, rate_unit):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for case in cases:
+            latency = case['latency_ms']
+            line = (
+                f"  {case['name']}: p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, "
+                f"p99 {latency.get('p99')} ms, {case[rate_key]} {rate_unit}"
+            )
+            if 'queries_per_request' in case:
+                line += f", {case['queries_per_request']} queries/request"
+            if 'errors' in case:
+                line += f", {case['errors']} errors"
+            self.stdout.write(line)
+
+    def write_encoding(self, cases):
+        self.stdout.write(self.style.MIGRATE_HEADING('Encoding (DRF JSONRenderer -> FastJSONRenderer, then compressed)'))
+        for case in cases:
+            sizes = ', '.join(f'{encoding} {size} B' for encoding, size in case['bytes'].items())
+            compress_ms = ', '.join(f"{encoding} {latency.get('p50')} ms" for encoding, latency in case['compress_ms'].items())
+            self.stdout.write(
+                f"  {case['name']}: p50 {case['drf_latency_ms'].get('p50')} ms -> {case['latency_ms'].get('p50')} ms, "
+                f"{case['megabytes_per_second']} MB/s; {sizes}; compress p50 {compress_ms or 'n/a'}"
+            )
+
+    def write_comparison(self, previous, results):
+        self.stdout.write(self.style.MIGRATE_HEADING('Change in p50 (after / before, below 1 is faster)'))
+        for section, name, before, after, change in benchmarks.compare(previous, results):
+            flag = ''
+            if change is not None and change >= 1.1:
+                flag = self.style.WARNING('  slower')
+            elif change is not None and change <= 0.9:
+                flag = self.style.SUCCESS('  faster')
+            self.stdout.write(f'  {section} {name}: {before} ms -> {after} ms ({change}x){flag}')
@@ -0,0 +1,148 @@
+import re
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from rest_framework import serializers
+
+from projects.filters import ATHLETE_SORTS, AthleteFilterSerializer, filter_athletes
+from projects.models import AthleteProfile, AthleteStats, Pledge, ProgressUpdate, TrendingRank
+from projects.pagination import (
+    AthleteProfilePagination,
+    CustomUserPagination,
+    KeysetPagination,
+    PledgePagination,
+    ProgressUpdatePagination,
+    _after,
+)
+from projects.serializers import EMBEDDED_LIMIT, with_counts
+
+# Plan lines that mean a whole table is read row by row
+SEQUENTIAL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on\b'),
+}
+# A value for each type of athlete list filter, to shape the plans with
+FILTER_SAMPLES = [
+    (serializers.BooleanField, True),
+    (serializers.IntegerField, 10),
+    (serializers.DecimalField, Decimal('50')),
+    (serializers.CharField, 'swimming'),
+]
+# Plan lines that mean rows are sorted after being read
+EXTRA_SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'^\s*(->\s*)?Sort\b'),
+}
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the querysets behind each API endpoint and flags sequential scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Use EXPLAIN ANALYZE on Postgres (runs the queries).',
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Exit with an error if any query is flagged.',
+        )
+
+    def handle(self, *args, **options):
+        database = options['database']
+        vendor = connections[database].vendor
+        if vendor not in SEQUENTIAL_SCAN:
+            raise CommandError(f'explain_queries supports SQLite and Postgres, not {vendor}.')
+
+        explain_options = {}
+        if options['analyze'] and vendor == 'postgresql':
+            explain_options['analyze'] = True
+
+        flagged = 0
+        for name, queryset in self.endpoint_querysets(database):
+            plan = queryset.using(database).explain(**explain_options)
+            lines = plan.splitlines()
+            sorts = [line.strip() for line in lines if EXTRA_SORT[vendor].search(line)]
+            scans = [line.strip() for line in lines if SEQUENTIAL_SCAN[vendor].search(line)]
+            if scans and not sorts and self.is_bounded(queryset):
+                # SQLite reports walking the rowid b-tree in key order as a
+                # plain SCAN; with a LIMIT and no sort it stops after one page
+                scans = []
+            problems = scans + sorts
+            if problems:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'FLAG  {name}'))
+                for line in problems:
+                    self.stdout.write(f'      {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK    {name}'))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan + '\n')
+
+        summary = f'{flagged} quer{"y" if flagged == 1 else "ies"} flagged.'
+        if flagged and options['strict']:
+            raise CommandError(summary)
+        self.stdout.write(summary)
+
+    def is_bounded(self, queryset):
+        return queryset.ordered and queryset.query.high_mark is not None
+
+    def athlete_list_querysets(self, database, limit):
+        # Every ?sort=, alone, on a cursor page and with each filter, built
+        # the way the list view builds them so new sorts and filters are covered
+        athlete = AthleteProfile.objects.using(database).first() or AthleteProfile(
+            pk=1, date_created=timezone.now(),
+        )
+        filters = {
+            name: sample
+            for name, field in AthleteFilterSerializer().fields.items() if name != 'sort'
+            for field_class, sample in FILTER_SAMPLES if isinstance(field, field_class)
+        }
+        for sort in ATHLETE_SORTS:
+            for name, value in [(None, None), *filters.items()]:
+                params = {'sort': sort} if name is None else {'sort': sort, name: value}
+                athletes, ordering = filter_athletes(AthleteProfile.objects.all(), params)
+                athletes = athletes.order_by(*ordering)
+                query = '&'.join(f'{key}={value}' for key, value in params.items())
+                yield f'GET /api/athletes/?{query}', athletes[:limit]
+                if name is None:
+                    position = [getattr(athlete, field.lstrip('-')) for field in ordering]
+                    yield f'GET /api/athletes/?{query}&cursor=', athletes.filter(_after(ordering, position))[:limit]
+
+    def endpoint_querysets(self, database):
+        # Sample keys only shape the plans; any ids will do on an empty table
+        athlete_id = AthleteProfile.objects.using(database).values_list('pk', flat=True).first() or 1
+        user_id = get_user_model().objects.using(database).values_list('pk', flat=True).first() or 1
+        now = timezone.now()
+        limit = KeysetPagination.page_size + 1
+
+        athletes = AthleteProfile.objects.order_by(*AthleteProfilePagination.ordering)
+        pledges = Pledge.objects.order_by(*PledgePagination.ordering)
+        updates = ProgressUpdate.objects.order_by(*ProgressUpdatePagination.ordering)
+        users = get_user_model().objects.order_by(*CustomUserPagination.ordering)
+
+        return [
+            *self.athlete_list_querysets(database, limit),
+            ('GET /api/athletes/leaderboard/', AthleteProfile.objects.order_by('-funds_raised', '-id')[:10]),
+            ('GET /api/athletes/leaderboard/?board=most_supporters', AthleteStats.objects.order_by(
+                '-supporter_count', '-athlete_profile')[:10]),
+            ('GET /api/athletes/leaderboard/?board=progress', AthleteProfile.objects.order_by(
+                '-percent_funded', '-id')[:10]),
+            ('GET /api/athletes/trending/', TrendingRank.objects.filter(window='24h', rank__lte=10).order_by('rank')),
+            ('GET /api/my-athletes/', athletes.filter(owner_id=user_id)[:limit]),
+            ('GET /api/athletes/<pk>/', with_counts(AthleteProfile.objects.filter(pk=athlete_id))),
+            ('GET /api/athletes/<pk>/ latest pledges', pledges.filter(athlete_profile_id=athlete_id)[:EMBEDDED_LIMIT]),
+            ('GET /api/athletes/<pk>/ latest updates', updates.filter(athlete_profile_id=athlete_id)[:EMBEDDED_LIMIT]),
+            ('GET /api/athletes/<pk>/pledges/', pledges.filter(athlete_profile_id=athlete_id)[:limit]),
+            ('GET /api/athletes/<pk>/updates/', updates.filter(athlete_profile_id=athlete_id)[:limit]),
+            ('GET /api/pledges/', pledges[:limit]),
+            ('GET /api/pledges/?cursor=', pledges.filter(_after(PledgePagination.ordering, [athlete_id]))[:limit]),
+            ('pledges by supporter', Pledge.objects.filter(supporter_id=user_id)),
+            ('GET /api/updates/', updates[:limit]),
+            ('GET /users/athletes/', users[:limit]),
+        ]
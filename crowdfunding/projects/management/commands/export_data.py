@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from projects.exports import CHUNK_SIZE, EXPORTS, FORMATS, export_lines, iter_chunks
+
+
+class Command(BaseCommand):
+    help = 'Streams every pledge or athlete to a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', dest='file_format')
+        parser.add_argument('--output', default='-', help='File to write, or - for stdout.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['kind'], options['file_format'], options['chunk_size'])
+        if options['output'] == '-':
+            for chunk in iter_chunks(lines):
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+            for chunk in iter_chunks(lines):
+                stream.write(chunk)
+        self.stderr.write(f"Wrote {options['kind']} to {options['output']}.")
@@ -0,0 +1,52 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.bulk import ingest_pledges, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports pledges from a CSV or NDJSON file, streaming it in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for stdin.')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], dest='file_format')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate every row without inserting anything.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format']
+        if file_format is None:
+            if path.endswith('.csv'):
+                file_format = 'csv'
+            elif path.endswith(('.ndjson', '.jsonl')):
+                file_format = 'ndjson'
+            else:
+                raise CommandError('Could not tell the file format, pass --format.')
+
+        def report(row_number, errors):
+            self.stderr.write(f'row {row_number}: {json.dumps(errors)}')
+
+        if path == '-':
+            result = self.ingest(sys.stdin.buffer, file_format, options, report)
+        else:
+            with open(path, 'rb') as stream:
+                result = self.ingest(stream, file_format, options, report)
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} pledge(s), {result.failed} row(s) rejected.'
+        ))
+
+    def ingest(self, stream, file_format, options, report):
+        return ingest_pledges(
+            read_rows(stream, file_format),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            on_error=report,
+        )
@@ -0,0 +1,61 @@
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.benchmarks import run_load
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives GET requests at a running server from many concurrent keep-alive '
+        'connections and reports requests/sec and latency percentiles per path. '
+        'Compare sync and async views by pointing it at /api/... and /api/async/... '
+        'on a server with ASYNC_VIEWS=False (under ASGI both are async by default).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='e.g. http://127.0.0.1:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path to request (can be repeated). Defaults to the sync and async athlete lists.',
+        )
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=10000, help='Requests per path.')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds per request.')
+        parser.add_argument('--header', action='append', default=[], help='Extra "Name: value" header.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('base_url must be a plain http:// URL.')
+        paths = options['paths'] or ['/api/athletes/', '/api/async/athletes/']
+
+        results = []
+        for path in paths:
+            result = asyncio.run(run_load(
+                url.hostname, url.port or 80, path,
+                concurrency=options['concurrency'],
+                total=options['requests'],
+                timeout=options['timeout'],
+                headers=options['header'],
+            ))
+            results.append(result)
+            if not options['json']:
+                self.stdout.write(format_result(result))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+
+
+def format_result(result):
+    latency = result['latency_ms']
+    return (
+        f"{result['path']}: {result['requests_per_second']} req/s "
+        f"({result['requests']} ok, {result['errors']} errors, c={result['concurrency']}, "
+        f"{result['seconds']}s) "
+        f"p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms "
+        f"statuses {result['statuses']}"
+    )
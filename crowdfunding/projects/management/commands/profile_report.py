@@ -0,0 +1,97 @@
+import datetime
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from projects.models import RequestProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Summarises stored request profiles: the functions that took the most '
+        'time and the slowest SQL statements, summed over the matching requests.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Rows to show in each table.')
+        parser.add_argument('--route', help='Only this URL pattern, e.g. api/athletes/<int:pk>/.')
+        parser.add_argument('--hours', type=float, help='Only profiles from the last N hours.')
+        parser.add_argument(
+            '--sort', choices=['own', 'cumulative'], default='own',
+            help='Rank functions by time spent in their own code (default) or including callees.',
+        )
+        parser.add_argument('--profile', type=int, help='Report on a single profile id.')
+
+    def handle(self, *args, **options):
+        profiles = RequestProfile.objects.order_by('pk')
+        if options['profile'] is not None:
+            profiles = profiles.filter(pk=options['profile'])
+        if options['route']:
+            profiles = profiles.filter(route=options['route'])
+        if options['hours']:
+            profiles = profiles.filter(created_at__gte=timezone.now() - datetime.timedelta(hours=options['hours']))
+        profiles = list(profiles.values('duration_ms', 'query_count', 'query_ms', 'functions', 'queries'))
+        if not profiles:
+            raise CommandError('No matching profiles.')
+
+        count = len(profiles)
+        total_ms = sum(profile['duration_ms'] for profile in profiles)
+        query_ms = sum(profile['query_ms'] for profile in profiles)
+        queries = sum(profile['query_count'] for profile in profiles)
+        self.stdout.write(
+            f'{count} request(s), {total_ms / count:.1f} ms average, '
+            f'{queries / count:.1f} queries taking {query_ms / count:.1f} ms average'
+        )
+
+        self.write_table(
+            f'Top functions by {options["sort"]} time',
+            ['own ms', 'cum ms', 'calls', 'function'],
+            top_functions(profiles, options['sort'], options['top']),
+        )
+        self.write_table(
+            'Slowest SQL',
+            ['total ms', 'runs', 'statement'],
+            top_queries(profiles, options['top']),
+        )
+
+    def write_table(self, title, headings, rows):
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write('  '.join(f'{heading:>9}' for heading in headings[:-1]) + '  ' + headings[-1])
+        for row in rows:
+            *numbers, label = row
+            cells = ['' if value is None else f'{value:9.1f}' if isinstance(value, float) else f'{value:>9}'
+                     for value in numbers]
+            self.stdout.write('  '.join(f'{cell:>9}' for cell in cells) + '  ' + label)
+
+
+def top_functions(profiles, sort, limit):
+    # function -> [own ms, cumulative ms, calls]; sampled profiles have no call counts
+    totals = defaultdict(lambda: [0.0, 0.0, None])
+    for profile in profiles:
+        for name, calls, own, cumulative in profile['functions']:
+            total = totals[name]
+            total[0] += own
+            total[1] += cumulative
+            if calls is not None:
+                total[2] = (total[2] or 0) + calls
+    key = 0 if sort == 'own' else 1
+    ranked = sorted(totals.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+    return [(own, cumulative, calls, name) for name, (own, cumulative, calls) in ranked]
+
+
+def top_queries(profiles, limit):
+    # Statements are logged with placeholders, so equal text is one query shape
+    totals = defaultdict(lambda: [0.0, 0])
+    for profile in profiles:
+        for sql, ms in profile['queries']:
+            total = totals[' '.join(sql.split())]
+            total[0] += ms
+            total[1] += 1
+    ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    return [(ms, runs, _shorten(sql)) for sql, (ms, runs) in ranked]
+
+
+def _shorten(sql, width=160):
+    return sql if len(sql) <= width else sql[:width - 3] + '...'
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from projects.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Drops and rebuilds the athlete full-text search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Searches keep seeing the old index until the new one is complete
+        with transaction.atomic():
+            count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} athlete(s).'))
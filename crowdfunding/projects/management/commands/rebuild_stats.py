@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.aggregates import find_drift, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the AthleteStats table from Pledge, or checks it for drift with --check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report rows that differ from the pledges, without writing anything.',
+        )
+        parser.add_argument(
+            '--athlete', type=int, action='append', dest='athlete_ids',
+            help='Limit to this athlete id (can be repeated).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        athlete_ids = options['athlete_ids']
+
+        if options['check']:
+            drift = find_drift(athlete_ids)
+            for athlete_id, field, stored, expected in drift:
+                self.stdout.write(f'athlete {athlete_id}: {field} is {stored}, expected {expected}')
+            if drift:
+                raise CommandError(f'{len(drift)} value(s) out of date, run rebuild_stats to fix them.')
+            self.stdout.write(self.style.SUCCESS('Athlete stats match the pledges.'))
+            return
+
+        count = rebuild_stats(athlete_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} athlete(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from projects.rankings import refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the trending snapshot from the hourly pledge buckets. Run it every few minutes.'
+
+    def handle(self, *args, **options):
+        count = refresh_trending()
+        self.stdout.write(self.style.SUCCESS(f'Ranked {count} trending athlete(s).'))
@@ -0,0 +1,63 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from projects import jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs from the queue until stopped (SIGTERM/SIGINT finish the current job first).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to run.')
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed at a time.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle.')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self.work(options)
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=self.work, args=(options,))
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.join()
+
+    def work(self, options):
+        stopping = []
+
+        def stop(signum, frame):
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        def report(job, succeeded):
+            if succeeded:
+                self.stdout.write(f'done   {job.name} #{job.pk}')
+            else:
+                self.stderr.write(f'failed {job.name} #{job.pk} (attempt {job.attempts} of {job.max_attempts})')
+
+        try:
+            jobs.work(
+                batch_size=options['batch_size'],
+                poll_interval=options['poll_interval'],
+                should_stop=lambda: bool(stopping),
+                once=options['once'],
+                on_job=report if options['verbosity'] > 1 else None,
+            )
+        finally:
+            connections.close_all()
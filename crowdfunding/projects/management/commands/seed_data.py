@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the database with synthetic users, athletes, pledges and progress '
+        'updates using bulk inserts, for benchmarking and local development.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--athletes', type=int, default=500)
+        parser.add_argument('--pledges', type=int, default=20000)
+        parser.add_argument('--updates', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=30, help='Spread pledge dates over the last N days.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, help='Random seed, for the same data set on every run.')
+        parser.add_argument('--force', action='store_true', help='Allow seeding when DEBUG is off.')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is off; this may be a real database. Pass --force to seed it anyway.')
+        if options['users'] and options['athletes'] and options['users'] < 2:
+            raise CommandError('Seeding athletes and pledges needs at least 2 users.')
+
+        result = seed(
+            users=options['users'],
+            athletes=options['athletes'],
+            pledges=options['pledges'],
+            updates=options['updates'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Seeded {result}.'))
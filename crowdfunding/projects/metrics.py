@@ -0,0 +1,311 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TOKEN': '',  # Bearer token for scrapers; staff users can always read /api/metrics/
+    'SLOW_REQUEST_SECONDS': 1.0,  # Requests slower than this are logged at WARNING
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# psycopg_pool get_stats() key: (metric, type, help, scale)
+POOL_STATS = {
+    'pool_size': ('db_pool_connections', 'gauge', 'Connections open in the pool.', 1),
+    'pool_available': ('db_pool_idle_connections', 'gauge', 'Pooled connections ready to hand out.', 1),
+    'pool_max': ('db_pool_max_connections', 'gauge', 'Size the pool may grow to.', 1),
+    'requests_waiting': ('db_pool_requests_waiting', 'gauge', 'Requests waiting for a connection now.', 1),
+    'requests_num': ('db_pool_requests_total', 'counter', 'Connections handed out.', 1),
+    'requests_queued': ('db_pool_requests_queued_total', 'counter', 'Requests that had to wait.', 1),
+    'requests_wait_ms': ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.', 0.001),
+    'requests_errors': ('db_pool_timeouts_total', 'counter', 'Requests that timed out waiting.', 1),
+    'connections_lost': ('db_pool_connections_lost_total', 'counter', 'Connections that failed a health check.', 1),
+    'connections_errors': ('db_pool_connect_errors_total', 'counter', 'Failed attempts to open a connection.', 1),
+}
+
+# Measurements for the request being handled, set by MetricsMiddleware.
+# sync_to_async copies the context, so DB work done in worker threads for
+# async views still lands on the right request.
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set, in the Prometheus layout.
+    """
+
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0])
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            count = 0
+            for bound, hits in zip((*self.buckets, '+Inf'), series):
+                count += hits
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = {}
+
+    def inc(self, *label_values):
+        self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+class Registry:
+    """
+    Request metrics for this worker process. Each gunicorn worker keeps its
+    own numbers; Prometheus sums them when they are scraped per worker, or
+    treat one worker's view as a sample.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter('http_requests_total', 'Requests handled.', ('view', 'method', 'status'))
+            self.latency = Histogram(
+                'http_request_duration_seconds', 'Time spent handling the request.',
+                LATENCY_BUCKETS, ('view', 'method'),
+            )
+            self.queries = Histogram(
+                'db_queries_per_request', 'Database queries run by one request.', QUERY_BUCKETS, ('view',),
+            )
+            self.query_time = Histogram(
+                'db_query_duration_seconds', 'Time one request spent waiting on the database.',
+                LATENCY_BUCKETS, ('view',),
+            )
+            self.serializer_time = Histogram(
+                'serializer_duration_seconds', 'Time one request spent in DRF serializers.',
+                LATENCY_BUCKETS, ('view',),
+            )
+            self.response_size = Histogram(
+                'http_response_size_bytes', 'Response body size (streamed responses are not counted).',
+                SIZE_BUCKETS, ('view',),
+            )
+            self.connections = Counter(
+                'db_connections_opened_total', 'Connections opened, or taken from the pool.', ('alias',),
+            )
+
+    def record(self, view, method, status, sample):
+        with self._lock:
+            self.requests.inc(view, method, str(status))
+            self.latency.observe(sample.duration, view, method)
+            self.queries.observe(sample.queries, view)
+            self.query_time.observe(sample.query_time, view)
+            self.serializer_time.observe(sample.serializer_time, view)
+            if sample.size is not None:
+                self.response_size.observe(sample.size, view)
+
+    def connection_opened(self, alias):
+        with self._lock:
+            self.connections.inc(alias)
+
+    def render(self):
+        with self._lock:
+            metrics = [
+                self.requests, self.latency, self.queries,
+                self.query_time, self.serializer_time, self.response_size, self.connections,
+            ]
+            lines = [line for metric in metrics for line in metric.render()]
+        lines.extend(render_pool_stats(pool_stats()))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def pool_stats():
+    """
+    {alias: psycopg_pool stats} for every database using Django's
+    connection pool (Postgres with OPTIONS['pool']).
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def render_pool_stats(stats):
+    lines = []
+    if not stats:
+        return lines
+    for key, (name, kind, help_text, scale) in POOL_STATS.items():
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'])
+        for alias, values in sorted(stats.items()):
+            # Counters the pool hasn't touched yet are left out of get_stats()
+            lines.append(f'{name}{{alias="{_escape(alias)}"}} {values.get(key, 0) * scale:g}')
+    return lines
+
+
+class Sample:
+    # What one request spent, filled in while it runs
+    __slots__ = ('started', 'duration', 'queries', 'query_time', 'serializer_time', 'serializer_depth', 'size')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.size = None
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper, installed on every connection (see
+    projects.apps). Costs one ContextVar lookup outside of requests.
+    """
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.query_time += time.perf_counter() - started
+
+
+def add_serializer_time(seconds):
+    # For serialization that doesn't go through TimedSerializerMixin
+    sample = _current.get()
+    if sample is not None:
+        sample.serializer_time += seconds
+
+
+class TimedSerializerMixin:
+    """
+    Adds the time spent turning objects into primitives to the current
+    request's serializer_time. Nested serializers are counted once, as part
+    of their parent.
+    """
+
+    def to_representation(self, instance):
+        sample = _current.get()
+        if sample is None:
+            return super().to_representation(instance)
+        sample.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            sample.serializer_depth -= 1
+            if not sample.serializer_depth:
+                sample.serializer_time += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Times every request and records it under its URL route, so
+    /api/athletes/1/ and /api/athletes/2/ share one series.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = get_config()['ENABLED']
+        self.is_async = iscoroutinefunction(self.get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        sample = Sample()
+        token = _current.set(sample)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, sample)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        sample = Sample()
+        token = _current.set(sample)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, sample)
+        return response
+
+    def finish(self, request, response, sample):
+        sample.duration = time.perf_counter() - sample.started
+        if not response.streaming:
+            sample.size = len(response.content)
+        match = request.resolver_match
+        view = match.route if match is not None else 'unmatched'
+        registry.record(view, request.method, response.status_code, sample)
+
+        if sample.duration >= get_config()['SLOW_REQUEST_SECONDS']:
+            logger.warning('slow request', extra={
+                'view': view,
+                'method': request.method,
+                'status': response.status_code,
+                'duration_ms': round(sample.duration * 1000, 1),
+                'queries': sample.queries,
+                'query_ms': round(sample.query_time * 1000, 1),
+                'serializer_ms': round(sample.serializer_time * 1000, 1),
+            })
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_customuser'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='athleteprofile',
+            options={'ordering': ['-date_created', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['-date_created', '-id'], name='athlete_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progressupdate',
+            index=models.Index(fields=['-date_posted', '-id'], name='update_posted_id_idx'),
+        ),
+    ]
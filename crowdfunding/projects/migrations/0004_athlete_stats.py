@@ -0,0 +1,64 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    AthleteProfile = apps.get_model('projects', 'AthleteProfile')
+    AthleteStats = apps.get_model('projects', 'AthleteStats')
+    rows = AthleteProfile.objects.order_by().values('pk').annotate(
+        pledge_count=models.Count('pledges'),
+        total_pledged=models.Sum('pledges__amount'),
+        anonymous_pledged=models.Sum('pledges__amount', filter=models.Q(pledges__anonymous=True)),
+        supporter_count=models.Count('pledges__supporter', distinct=True),
+        last_pledge_at=models.Max('pledges__date_created'),
+    )
+    AthleteStats.objects.bulk_create([
+        AthleteStats(
+            athlete_profile_id=row['pk'],
+            pledge_count=row['pledge_count'],
+            total_pledged=row['total_pledged'] or 0,
+            anonymous_pledged=row['anonymous_pledged'] or 0,
+            supporter_count=row['supporter_count'],
+            last_pledge_at=row['last_pledge_at'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AthleteStats',
+            fields=[
+                ('athlete_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='projects.athleteprofile')),
+                ('pledge_count', models.PositiveIntegerField(default=0)),
+                ('total_pledged', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('anonymous_pledged', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('supporter_count', models.PositiveIntegerField(default=0)),
+                ('last_pledge_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'athlete stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='pledge',
+            name='date_created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='pledge',
+            index=models.Index(fields=['athlete_profile', 'supporter'], name='pledge_athlete_supporter_idx'),
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_athlete_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['is_open', '-date_created', '-id'], name='athlete_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['owner', '-date_created', '-id'], name='athlete_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pledge',
+            index=models.Index(fields=['athlete_profile', 'id'], name='pledge_athlete_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progressupdate',
+            index=models.Index(fields=['athlete_profile', '-date_posted'], name='update_athlete_posted_idx'),
+        ),
+    ]
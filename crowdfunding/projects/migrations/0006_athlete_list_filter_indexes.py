@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_hot_lookup_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['sport', '-date_created', '-id'], name='athlete_sport_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['age'], name='athlete_age_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['-funds_raised', '-id'], name='athlete_funds_raised_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from projects import search
+
+    backend = search.get_backend(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+
+    # Index the athletes that already exist
+    AthleteProfile = apps.get_model('projects', 'AthleteProfile')
+    ProgressUpdate = apps.get_model('projects', 'ProgressUpdate')
+    updates = {}
+    for athlete_id, title, content in ProgressUpdate.objects.values_list('athlete_profile_id', 'title', 'content'):
+        updates.setdefault(athlete_id, []).extend([title, content])
+    with schema_editor.connection.cursor() as cursor:
+        for pk, *athlete in AthleteProfile.objects.values_list('pk', *search.DOCUMENT_FIELDS):
+            backend.upsert(cursor, pk, search.build_document(athlete, updates.get(pk, [])))
+
+
+def drop_index(apps, schema_editor):
+    from projects import search
+
+    with schema_editor.connection.cursor() as cursor:
+        search.get_backend(schema_editor.connection.vendor).drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_athlete_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:34
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_rankings(apps, schema_editor):
+    AthleteProfile = apps.get_model('projects', 'AthleteProfile')
+    Pledge = apps.get_model('projects', 'Pledge')
+    PledgeBucket = apps.get_model('projects', 'PledgeBucket')
+
+    from projects.models import percent_funded
+
+    AthleteProfile.objects.update(percent_funded=percent_funded())
+
+    # Hourly buckets for the pledges still inside the 7 day trending window
+    since = timezone.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(days=7)
+    buckets = defaultdict(lambda: [Decimal('0'), 0])
+    pledges = Pledge.objects.filter(date_created__gt=since).values_list('athlete_profile_id', 'date_created', 'amount')
+    for athlete_id, date_created, amount in pledges.iterator():
+        hour = date_created.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        bucket = buckets[(athlete_id, hour)]
+        bucket[0] += amount
+        bucket[1] += 1
+    PledgeBucket.objects.bulk_create([
+        PledgeBucket(athlete_profile_id=athlete_id, hour=hour, amount=amount, pledge_count=count)
+        for (athlete_id, hour), (amount, count) in buckets.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_athlete_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PledgeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('pledge_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=8)),
+                ('rank', models.PositiveIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('pledge_count', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['window', 'rank'],
+            },
+        ),
+        migrations.AddField(
+            model_name='athleteprofile',
+            name='percent_funded',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['-percent_funded', '-id'], name='athlete_percent_funded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athletestats',
+            index=models.Index(fields=['-supporter_count', '-athlete_profile'], name='stats_supporters_idx'),
+        ),
+        migrations.AddField(
+            model_name='pledgebucket',
+            name='athlete_profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pledge_buckets', to='projects.athleteprofile'),
+        ),
+        migrations.AddField(
+            model_name='trendingrank',
+            name='athlete_profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.athleteprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='pledgebucket',
+            index=models.Index(fields=['hour'], name='pledge_bucket_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pledgebucket',
+            constraint=models.UniqueConstraint(fields=('athlete_profile', 'hour'), name='pledge_bucket_athlete_hour'),
+        ),
+        migrations.AddConstraint(
+            model_name='trendingrank',
+            constraint=models.UniqueConstraint(fields=('window', 'rank'), name='trending_rank_window_rank'),
+        ),
+        migrations.RunPython(populate_rankings, migrations.RunPython.noop),
+    ]
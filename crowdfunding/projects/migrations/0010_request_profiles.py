@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('route', models.CharField(max_length=200)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('mode', models.CharField(choices=[('cprofile', 'cProfile'), ('sample', 'Stack sampling')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField()),
+                ('query_ms', models.FloatField()),
+                ('functions', models.JSONField(default=list)),
+                ('stacks', models.TextField(blank=True)),
+                ('queries', models.JSONField(default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['route', '-created_at'], name='profile_route_created_idx')],
+            },
+        ),
+    ]
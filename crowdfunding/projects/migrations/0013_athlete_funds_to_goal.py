@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_funds_to_goal(apps, schema_editor):
+    AthleteProfile = apps.get_model('projects', 'AthleteProfile')
+
+    from projects.models import funds_to_goal
+
+    AthleteProfile.objects.update(funds_to_goal=funds_to_goal())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0012_applied_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='athleteprofile',
+            name='funds_to_goal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['funds_to_goal', 'id'], name='athlete_funds_to_goal_idx'),
+        ),
+        migrations.RunPython(populate_funds_to_goal, migrations.RunPython.noop),
+    ]
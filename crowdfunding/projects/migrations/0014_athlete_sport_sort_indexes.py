@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_athlete_funds_to_goal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['sport', '-funds_raised', '-id'], name='athlete_sport_funds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['sport', '-percent_funded', '-id'], name='athlete_sport_percent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athleteprofile',
+            index=models.Index(fields=['sport', 'funds_to_goal', 'id'], name='athlete_sport_to_goal_idx'),
+        ),
+    ]
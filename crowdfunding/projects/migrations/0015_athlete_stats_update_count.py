@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_update_count(apps, schema_editor):
+    AthleteStats = apps.get_model('projects', 'AthleteStats')
+    ProgressUpdate = apps.get_model('projects', 'ProgressUpdate')
+
+    updates = (
+        ProgressUpdate.objects.filter(athlete_profile=OuterRef('athlete_profile'))
+        .order_by().values('athlete_profile').annotate(count=Count('pk')).values('count')
+    )
+    AthleteStats.objects.update(update_count=Coalesce(Subquery(updates), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0014_athlete_sport_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='athletestats',
+            name='update_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_update_count, migrations.RunPython.noop),
+    ]
@@ -3,8 +3,20 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.db import transaction
+from django.db.models.functions import Greatest, Round
+from django.db.models.lookups import GreaterThan
 from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
 from django.contrib.auth.models import AbstractUser
+import logging
+from . import aggregates
+from . import cache
+from . import tasks
+
+logger = logging.getLogger(__name__)
+
+# AthleteProfile columns written by pledge accounting, never by profile edits
+FUNDING_COLUMNS = ('funds_raised', 'percent_funded', 'funds_to_goal')
 
 class AthleteProfile(models.Model):
     # Basic athlete information
@@ -17,6 +29,8 @@ class AthleteProfile(models.Model):
     # Funding related details
     goal = models.DecimalField(max_digits=10, decimal_places=2, null=False)  # Financial goal for the athlete
     funds_raised = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Automatically updated as pledges come in
+    percent_funded = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # funds_raised / goal, kept with funds_raised
+    funds_to_goal = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # funds_remaining(), kept with funds_raised
     is_open = models.BooleanField(default=True)  # Is the campaign still accepting funds?
 
     # Transparency and impact features
@@ -42,7 +56,25 @@ class AthleteProfile(models.Model):
         return f"{self.first_name} {self.last_name} - {self.sport}"
 
     class Meta:
-        ordering = ['-date_created']  # Orders profiles by most recent first
+        ordering = ['-date_created', '-id']  # Orders profiles by most recent first
+        indexes = [
+            # Backs keyset pagination on the list endpoint
+            models.Index(fields=['-date_created', '-id'], name='athlete_created_id_idx'),
+            # Open campaigns, newest first
+            models.Index(fields=['is_open', '-date_created', '-id'], name='athlete_open_created_idx'),
+            # List filters and sorts
+            models.Index(fields=['sport', '-date_created', '-id'], name='athlete_sport_created_idx'),
+            models.Index(fields=['age'], name='athlete_age_idx'),
+            models.Index(fields=['-funds_raised', '-id'], name='athlete_funds_raised_idx'),
+            models.Index(fields=['-percent_funded', '-id'], name='athlete_percent_funded_idx'),
+            models.Index(fields=['funds_to_goal', 'id'], name='athlete_funds_to_goal_idx'),
+            # The funding sorts within one sport
+            models.Index(fields=['sport', '-funds_raised', '-id'], name='athlete_sport_funds_idx'),
+            models.Index(fields=['sport', '-percent_funded', '-id'], name='athlete_sport_percent_idx'),
+            models.Index(fields=['sport', 'funds_to_goal', 'id'], name='athlete_sport_to_goal_idx'),
+            # An owner's athletes, newest first (my-athletes)
+            models.Index(fields=['owner', '-date_created', '-id'], name='athlete_owner_created_idx'),
+        ]
 
     def funds_remaining(self):
         # Ensure funds_remaining returns a minimum of 0 if funds_raised exceeds the goal
@@ -53,17 +85,118 @@ class AthleteProfile(models.Model):
         if not (5 <= self.age <= 18):
             raise ValidationError({'age': 'Age must be between 5 and 18.'})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored goal, so save() can tell whether the columns derived from
+        # it need redoing
+        instance._saved_goal = dict(zip(field_names, values)).get('goal')
+        return instance
+
     def save(self, *args, **kwargs):
-        print(f"Saving AthleteProfile: {self.first_name} {self.last_name}, Progress Updates: {self.progress_updates}")
+        logger.debug('saving athlete profile', extra={'athlete_id': self.pk, 'adding': self._state.adding})
+        creating = self._state.adding
+        goal_changed = False
+        if creating:
+            # Written by the INSERT itself; funds_raised can start above zero
+            self.percent_funded = percent_of_goal(self.funds_raised, self.goal)
+            self.funds_to_goal = left_to_goal(self.funds_raised, self.goal)
+        else:
+            # funds_raised belongs to the pledge accounting path (adjust_funds), so
+            # profile edits leave that column alone instead of writing back a
+            # possibly stale in-memory value
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in FUNDING_COLUMNS
+                ]
+                goal_changed = self.goal != getattr(self, '_saved_goal', None)
+            else:
+                goal_changed = 'goal' in update_fields
+            if goal_changed:
+                # Recomputed from the stored funds_raised in the same UPDATE
+                goal = models.Value(Decimal(str(self.goal)))
+                self.percent_funded = percent_funded(goal=goal)
+                self.funds_to_goal = funds_to_goal(goal=goal)
+                update_fields = [*update_fields, 'percent_funded', 'funds_to_goal']
+            kwargs['update_fields'] = update_fields
         super(AthleteProfile, self).save(*args, **kwargs)
+        self._saved_goal = self.goal
+        if goal_changed:
+            # Loaded again from the row if they are read
+            del self.__dict__['percent_funded']
+            del self.__dict__['funds_to_goal']
+        if creating:
+            # Start every athlete with an empty stats row for pledges to update
+            AthleteStats.objects.get_or_create(athlete_profile=self)
+
+    @classmethod
+    def lock(cls, *pks):
+        # Row locks in pk order, so writers locking several can't deadlock
+        list(cls.objects.select_for_update().filter(pk__in=pks).order_by('pk').values_list('pk', flat=True))
+
+    @classmethod
+    def adjust_funds(cls, pk, amount):
+        # One UPDATE ... SET funds_raised = funds_raised + amount, so concurrent
+        # pledges can't overwrite each other's increments
+        cls.objects.filter(pk=pk).update(
+            funds_raised=models.F('funds_raised') + amount,
+            percent_funded=percent_funded(models.F('funds_raised') + amount),
+            funds_to_goal=funds_to_goal(models.F('funds_raised') + amount),
+        )
+
+def percent_funded(funds_raised=models.F('funds_raised'), goal=models.F('goal')):
+    # funds_raised / goal as a percentage, rounded so that it is stored and
+    # compared exactly (SQLite does this arithmetic in floating point)
+    return models.Case(
+        models.When(GreaterThan(goal, 0), then=Round(_Percent(funds_raised, goal), 2)),
+        default=models.Value(0),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def percent_of_goal(funds_raised, goal):
+    # percent_funded() for values not in the database yet
+    funds_raised, goal = Decimal(str(funds_raised)), Decimal(str(goal))
+    if goal <= 0:
+        return Decimal('0.00')
+    return (funds_raised * 100 / goal).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def funds_to_goal(funds_raised=models.F('funds_raised'), goal=models.F('goal')):
+    # AthleteProfile.funds_remaining() in SQL, rounded like percent_funded()
+    return Greatest(
+        Round(goal - funds_raised, 2),
+        models.Value(0),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def left_to_goal(funds_raised, goal):
+    # funds_to_goal() for values not in the database yet
+    funds_raised, goal = Decimal(str(funds_raised)), Decimal(str(goal))
+    return max(goal - funds_raised, Decimal('0')).quantize(Decimal('0.01'))
 
 
+class _Percent(models.Func):
+    # part * 100 / whole
+    template = '(%(expressions)s)'
+    arg_joiner = ' * 100 / '
+    output_field = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite keeps whole-number decimals as integers and would divide them
+        # as integers, 525 * 100 / 10000 = 5
+        return self.as_sql(compiler, connection, arg_joiner=' * 100.0 / ', **extra_context)
+
 
 class Pledge(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     comment = models.TextField(blank=True)
     anonymous = models.BooleanField(default=False)
     is_fulfilled = models.BooleanField(default=True)
+    date_created = models.DateTimeField(default=timezone.now)
 
     athlete_profile = models.ForeignKey(
     'AthleteProfile',
@@ -80,9 +213,30 @@ class Pledge(models.Model):
         related_name='pledges'
     )
 
+    class Meta:
+        indexes = [
+            # Unique supporter checks when maintaining AthleteStats
+            models.Index(fields=['athlete_profile', 'supporter'], name='pledge_athlete_supporter_idx'),
+            # An athlete's pledges in id order (prefetches, per-athlete paging)
+            models.Index(fields=['athlete_profile', 'id'], name='pledge_athlete_id_idx'),
+            # One athlete's pledges in an hour, for trending buckets
+            models.Index(fields=['athlete_profile', 'date_created'], name='pledge_athlete_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.supporter} pledged {self.amount} to {self.athlete_profile}"
 
+    def snapshot(self):
+        # The values AthleteStats are derived from
+        return {
+            'id': self.pk,
+            'athlete_profile_id': self.athlete_profile_id,
+            'supporter_id': self.supporter_id,
+            'amount': self.amount,
+            'anonymous': self.anonymous,
+            'date_created': self.date_created,
+        }
+
     def clean(self):
         if not self.athlete_profile:
             raise ValidationError({'athlete_profile': 'An athlete profile is required.'})
@@ -96,11 +250,284 @@ class Pledge(models.Model):
     def save(self, *args, **kwargs):
         self.clean()
         with transaction.atomic():  # Ensure atomic database updates
+            previous = None
+            if not self._state.adding:
+                # Lock the stored row so concurrent edits apply their deltas in turn
+                previous = (
+                    Pledge.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values('id', 'athlete_profile_id', 'supporter_id', 'amount', 'anonymous', 'date_created')
+                    .first()
+                )
+            athlete_ids = {self.athlete_profile_id}
+            if previous is not None:
+                athlete_ids.add(previous['athlete_profile_id'])
+            # Pledges to an athlete are written one at a time, so the
+            # supporter checks in pledge_changed see each other's rows
+            AthleteProfile.lock(*athlete_ids)
             super(Pledge, self).save(*args, **kwargs)
-            if self.athlete_profile:
-                self.athlete_profile.funds_raised += self.amount
-                self.athlete_profile.save()
-        print(f"Updating funds for AthleteProfile {self.athlete_profile.id}")
+            # Stats and trending buckets are brought up to date by a worker
+            tasks.pledge_changed(previous, self.snapshot())
+
+            if previous is None:
+                AthleteProfile.adjust_funds(self.athlete_profile_id, self.amount)
+            elif previous['athlete_profile_id'] != self.athlete_profile_id:
+                AthleteProfile.adjust_funds(previous['athlete_profile_id'], -previous['amount'])
+                AthleteProfile.adjust_funds(self.athlete_profile_id, self.amount)
+            elif previous['amount'] != self.amount:
+                AthleteProfile.adjust_funds(self.athlete_profile_id, self.amount - previous['amount'])
+
+            # Only this athlete's cached pages (and the old one's, if moved) go stale
+            cache.invalidate_athletes(*athlete_ids, tags=['pledges', cache.FUNDING_TAG])
+        logger.debug('pledge saved', extra={
+            'pledge_id': self.pk, 'athlete_id': self.athlete_profile_id, 'created': previous is None,
+        })
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Take back what the stored row contributed, not the in-memory copy
+            previous = (
+                Pledge.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values('id', 'athlete_profile_id', 'supporter_id', 'amount', 'anonymous', 'date_created')
+                .first()
+            )
+            if previous is not None:
+                AthleteProfile.lock(previous['athlete_profile_id'])
+            result = super(Pledge, self).delete(*args, **kwargs)
+            if previous is not None:
+                AthleteProfile.adjust_funds(previous['athlete_profile_id'], -previous['amount'])
+                tasks.pledge_changed(previous, None)
+                cache.invalidate_athletes(previous['athlete_profile_id'], tags=['pledges', cache.FUNDING_TAG])
+        return result
+
+
+class AthleteStats(models.Model):
+    """
+    Per-athlete pledge totals, updated incrementally by a job after every
+    pledge write (see projects.aggregates and projects.tasks) so readers
+    never aggregate Pledge themselves. update_count is kept by
+    ProgressUpdate.save() and delete() in their own transaction.
+    """
+    athlete_profile = models.OneToOneField(
+        'AthleteProfile',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    pledge_count = models.PositiveIntegerField(default=0)
+    total_pledged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    anonymous_pledged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    supporter_count = models.PositiveIntegerField(default=0)  # Unique supporters
+    last_pledge_at = models.DateTimeField(null=True, blank=True)
+    update_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'athlete stats'
+        indexes = [
+            # Most supporters leaderboard
+            models.Index(fields=['-supporter_count', '-athlete_profile'], name='stats_supporters_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.athlete_profile_id}: {self.pledge_count} pledges, {self.total_pledged} pledged"
+
+    @classmethod
+    def adjust_updates(cls, athlete_id, count):
+        # One UPDATE ... SET update_count = update_count + count, as adjust_funds
+        updated = cls.objects.filter(athlete_profile_id=athlete_id).update(
+            update_count=models.F('update_count') + count
+        )
+        if not updated:
+            # No stats row to add to: build it, as aggregates.apply_delta does
+            aggregates.rebuild_stats([athlete_id])
+
+
+class PledgeBucket(models.Model):
+    """
+    Pledge totals per athlete per hour over the longest trending window,
+    updated on every pledge write (see projects.rankings).
+    """
+    athlete_profile = models.ForeignKey(
+        'AthleteProfile',
+        on_delete=models.CASCADE,
+        related_name='pledge_buckets'
+    )
+    hour = models.DateTimeField()  # Start of the hour
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pledge_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['athlete_profile', 'hour'], name='pledge_bucket_athlete_hour'),
+        ]
+        indexes = [
+            # Window scans and pruning
+            models.Index(fields=['hour'], name='pledge_bucket_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} pledged to {self.athlete_profile_id} in the hour from {self.hour}"
+
+
+class TrendingRank(models.Model):
+    """
+    Snapshot of the top athletes by pledges in each trending window,
+    rebuilt from PledgeBucket every few minutes.
+    """
+    window = models.CharField(max_length=8)  # Key of rankings.TRENDING_WINDOWS
+    rank = models.PositiveIntegerField()
+    athlete_profile = models.ForeignKey(
+        'AthleteProfile',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    pledge_count = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['window', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'rank'], name='trending_rank_window_rank'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} trending ({self.window}): {self.athlete_profile_id}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by the run_jobs workers (see
+    projects.jobs).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)  # Handler registered in projects.jobs
+    payload = models.JSONField(default=dict)
+    # Jobs with the same key do the same work; only one can wait in the queue
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=32, blank=True)  # Claim token of the worker running it
+    locked_until = models.DateTimeField(null=True, blank=True)  # Lease; after this another worker may take it
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=models.Q(status='queued'),
+                name='job_queued_key_unique',
+            ),
+        ]
+        indexes = [
+            # Claiming due jobs and finding expired leases
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['locked_by'], name='job_locked_by_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class AppliedJob(models.Model):
+    """
+    Key of a job whose changes have been applied, for handlers that apply
+    deltas and so must not run twice (see jobs.apply_once).
+    """
+    key = models.CharField(max_length=200, unique=True)
+    applied_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Purging old keys with the finished jobs
+            models.Index(fields=['applied_at'], name='applied_job_applied_at_idx'),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class RequestProfile(models.Model):
+    """
+    One profiled request, captured by ProfilingMiddleware (see
+    projects.profiling).
+    """
+    CPROFILE = 'cprofile'
+    SAMPLE = 'sample'
+    MODE_CHOICES = [
+        (CPROFILE, 'cProfile'),
+        (SAMPLE, 'Stack sampling'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    route = models.CharField(max_length=200)  # URL pattern, e.g. api/athletes/<int:pk>/
+    status = models.PositiveSmallIntegerField()
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_ms = models.FloatField()
+    # [[function, calls, own ms, cumulative ms]], slowest cumulative first
+    functions = models.JSONField(default=list)
+    # Collapsed stacks ("outer;inner;leaf samples" per line) for flamegraph tools
+    stacks = models.TextField(blank=True)
+    queries = models.JSONField(default=list)  # [[sql, ms]] in execution order
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['route', '-created_at'], name='profile_route_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a write sent with an Idempotency-Key header, replayed
+    when the client retries with the same key (see projects.idempotency).
+    """
+    supporter = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of the request, so a key can't be reused for another one
+    status_code = models.PositiveSmallIntegerField()
+    content_type = models.CharField(max_length=100)
+    content = models.BinaryField()  # The rendered body, replayed byte for byte
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Also the index replays are looked up by
+            models.UniqueConstraint(fields=['supporter', 'key'], name='idempotency_supporter_key_unique'),
+        ]
+        indexes = [
+            # Purging expired keys
+            models.Index(fields=['expires_at'], name='idempotency_expires_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for user {self.supporter_id} ({self.status_code})"
 
 
 class ProgressUpdate(models.Model):
@@ -112,10 +539,44 @@ class ProgressUpdate(models.Model):
     title = models.CharField(max_length=200)  # Title of the update
     content = models.TextField()  # The body of the update (e.g., progress, results, news)
     date_posted = models.DateTimeField(auto_now_add=True)  # Timestamp for the update
-    
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination on the list endpoint
+            models.Index(fields=['-date_posted', '-id'], name='update_posted_id_idx'),
+            # An athlete's updates, newest first
+            models.Index(fields=['athlete_profile', '-date_posted'], name='update_athlete_posted_idx'),
+        ]
+
     def __str__(self):
         return f"Update: {self.title} for {self.athlete_profile}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    ProgressUpdate.objects.select_for_update()
+                    .filter(pk=self.pk).values_list('athlete_profile_id', flat=True).first()
+                )
+            super(ProgressUpdate, self).save(*args, **kwargs)
+            # AthleteStats.update_count follows the update to its athlete
+            if previous != self.athlete_profile_id:
+                if previous is not None:
+                    AthleteStats.adjust_updates(previous, -1)
+                AthleteStats.adjust_updates(self.athlete_profile_id, 1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = (
+                ProgressUpdate.objects.select_for_update()
+                .filter(pk=self.pk).values_list('athlete_profile_id', flat=True).first()
+            )
+            result = super(ProgressUpdate, self).delete(*args, **kwargs)
+            if previous is not None:
+                AthleteStats.adjust_updates(previous, -1)
+        return result
+
 
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
@@ -0,0 +1,225 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique ordering. Each page is fetched with a
+    WHERE on the keys of the last row seen instead of an OFFSET, so page
+    10,000 costs the same as page 1.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Must end in a unique column so every row has a distinct position
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request):
+        # The query for the requested page, one row longer than the page
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [_invert(name) for name in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        names, deferring = queryset.query.deferred_loading
+        if names and not deferring:
+            # The view narrowed the columns with only(); the cursor still needs these
+            columns = [name.lstrip('-') for name in ordering]
+            queryset = queryset.only(*names, *[name for name in columns if name not in queryset.query.annotations])
+        if self.position is not None:
+            self.position = self.clean_position(queryset, self.position)
+            queryset = queryset.filter(_after(ordering, self.position))
+
+        # Fetch one extra row to find out whether there is another page
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Ran off the end, step back from the start of the table
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_position(self, row):
+        # Rows are model instances, or dicts when the view used values()
+        names = [name.lstrip('-') for name in self.ordering]
+        if isinstance(row, dict):
+            return [_encode_value(row[name]) for name in names]
+        return [_encode_value(getattr(row, name)) for name in names]
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = payload['p']
+            reverse = bool(payload['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+
+    def clean_position(self, queryset, position):
+        # The cursor came from the client: each value must be a valid value of its column
+        try:
+            return [
+                _to_python(queryset, name.lstrip('-'), value) for name, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, ValueError, TypeError, OverflowError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class AthleteProfilePagination(KeysetPagination):
+    ordering = ('-date_created', '-id')
+
+
+class PledgePagination(KeysetPagination):
+    ordering = ('-id',)
+
+
+class ProgressUpdatePagination(KeysetPagination):
+    ordering = ('-date_posted', '-id')
+
+
+class CustomUserPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class KeysetPaginationMixin:
+    """
+    Gives an APIView the paginator helpers GenericAPIView has, driven by
+    its pagination_class.
+    """
+    pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+    def paginate_queryset(self, queryset):
+        return self.paginator.paginate_queryset(queryset, self.request, view=self)
+
+    async def apaginate_queryset(self, queryset):
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+def _invert(name):
+    return name[1:] if name.startswith('-') else '-' + name
+
+
+def _after(ordering, position):
+    # Lexicographic "comes after" on the ordering columns:
+    # (a > x) OR (a = x AND b > y) OR ...
+    condition = Q()
+    for i, name in enumerate(ordering):
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        clause = Q(**{f'{name.lstrip("-")}__{lookup}': position[i]})
+        for previous, value in zip(ordering[:i], position):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+def _to_python(queryset, name, value):
+    # Ordering columns are never null, so a null position can't have come from a page
+    if value is None:
+        raise ValueError(f'No {name} in cursor')
+    if name in queryset.query.annotations:
+        field = queryset.query.annotations[name].output_field
+    else:
+        field = queryset.model._meta.get_field(name)
+    value = field.to_python(value)
+    field.run_validators(value)
+    return value
+
+
+def _encode_value(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return str(value)
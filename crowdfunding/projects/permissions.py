@@ -1,5 +1,8 @@
+from django.utils.crypto import constant_time_compare
 from rest_framework import permissions
 
+from .metrics import get_config as get_metrics_config
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
     Allows object owners to edit. Read-only for others.
@@ -54,3 +57,15 @@ class IsBothOrFullAccess(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role == 'both'
+
+
+class CanReadMetrics(permissions.BasePermission):
+    """
+    Allows staff users, or a scraper sending the METRICS['TOKEN'] bearer token.
+    """
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = get_metrics_config()['TOKEN']
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and constant_time_compare(header, f'Bearer {token}')
@@ -0,0 +1,345 @@
+import contextlib
+import contextvars
+import cProfile
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils.crypto import constant_time_compare
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'HEADER': 'X-Profile',  # Profiles the request when it carries TOKEN
+    'MODE_HEADER': 'X-Profile-Mode',  # Optional: 'cprofile' or 'sample'
+    'TOKEN': '',  # Empty turns the header trigger off
+    'SAMPLE_RATE': 0.0,  # Fraction of all other requests to profile
+    'MODE': 'cprofile',  # or 'sample' (see RequestProfile.MODE_CHOICES)
+    'SAMPLE_INTERVAL': 0.005,  # Seconds between stack samples
+    'KEEP': 500,  # Profiles kept; older ones are deleted as new ones arrive
+    'MAX_QUERIES': 1000,  # SQL statements logged per profile (all are counted)
+    'FUNCTIONS_KEPT': 200,
+    'EXCLUDE': ['/api/profiles/', '/api/metrics/', '/admin/', '/static/'],
+}
+
+# The profile being captured for the current request
+_capture = contextvars.ContextVar('request_profile', default=None)
+# cProfile and the sampler watch a whole thread, so one request at a time
+_busy = threading.Lock()
+_path_prefixes = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+class StackSampler(threading.Thread):
+    """
+    Records the call stack of one thread every `interval` seconds, as
+    collapsed stacks. Much cheaper than cProfile on deep call trees, and
+    what flamegraph.pl or speedscope read.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Capture:
+    """
+    Everything recorded for one profiled request.
+    """
+
+    def __init__(self, mode, config):
+        self.mode = mode
+        self.config = config
+        self.queries = []
+        self.query_count = 0
+        self.query_time = 0.0
+        # Thread id -> the cProfile.Profile or StackSampler watching it
+        self.profilers = {}
+        self.samplers = {}
+        self.started = None
+        self.duration = 0.0
+        self._token = None
+
+    def start(self):
+        self._token = _capture.set(self)
+        self.started = time.perf_counter()
+        self.watch()
+
+    def watch(self):
+        """
+        Profiles the calling thread too, until unwatch() is called from it.
+        False if it is already being watched. Under ASGI the request's sync
+        work (sync views, DRF authentication, the ORM) and its async work
+        run in different threads.
+        """
+        thread_id = threading.get_ident()
+        if thread_id in self.profilers or thread_id in self.samplers:
+            return False
+        if self.mode == models.RequestProfile.SAMPLE:
+            self.samplers[thread_id] = StackSampler(thread_id, self.config['SAMPLE_INTERVAL'])
+            self.samplers[thread_id].start()
+        else:
+            # One Profile per thread: it can only follow one call stack
+            self.profilers[thread_id] = cProfile.Profile()
+            self.profilers[thread_id].enable()
+        return True
+
+    def unwatch(self):
+        # cProfile only turns off in the thread it was turned on in
+        thread_id = threading.get_ident()
+        if thread_id in self.profilers:
+            self.profilers[thread_id].disable()
+        if thread_id in self.samplers:
+            self.samplers[thread_id].stop()
+
+    def stop(self):
+        try:
+            self.unwatch()
+            self.duration = time.perf_counter() - self.started
+            _capture.reset(self._token)
+        finally:
+            _busy.release()
+
+    def functions(self):
+        if self.profilers:
+            stats = pstats.Stats(*self.profilers.values())
+            rows = [
+                [_function_name(*function), calls, own * 1000, cumulative * 1000]
+                for function, (_, calls, own, cumulative, _) in stats.stats.items()
+            ]
+        else:
+            rows = stack_functions(self.collapsed(), self.config['SAMPLE_INTERVAL'])
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return [
+            [name, calls, round(own, 3), round(cumulative, 3)]
+            for name, calls, own, cumulative in rows[:self.config['FUNCTIONS_KEPT']]
+        ]
+
+    def collapsed(self):
+        # Stack counts from every thread watched
+        return sum((sampler.stacks for sampler in self.samplers.values()), Counter())
+
+    def stacks(self):
+        if not self.samplers:
+            return ''
+        return '\n'.join(f'{stack} {count}' for stack, count in self.collapsed().most_common())
+
+
+@contextlib.contextmanager
+def watching():
+    """
+    Profiles the calling thread for the duration of the block, when the
+    current request is being profiled. For views that run in another
+    thread than the middleware, e.g. async views behind sync middleware.
+    """
+    capture = _capture.get()
+    if capture is None or not capture.watch():
+        yield
+        return
+    try:
+        yield
+    finally:
+        capture.unwatch()
+
+
+def stack_functions(stacks, interval):
+    """
+    [[function, None, own ms, cumulative ms]] from collapsed stack counts:
+    own time is samples with the function on top, cumulative is samples with
+    it anywhere in the stack.
+    """
+    own = Counter()
+    cumulative = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            cumulative[frame] += count
+    ms = interval * 1000
+    return [[name, None, own[name] * ms, samples * ms] for name, samples in cumulative.items()]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper, installed on every connection (see
+    projects.signals). Only the SQL text is kept, never the parameters.
+    """
+    capture = _capture.get()
+    if capture is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        capture.query_count += 1
+        capture.query_time += elapsed
+        if len(capture.queries) < capture.config['MAX_QUERIES']:
+            capture.queries.append([sql, round(elapsed * 1000, 3)])
+
+
+def begin(request):
+    """
+    Returns a started Capture when this request should be profiled: it
+    carries the profiling header with the right token, or it was picked at
+    SAMPLE_RATE. Returns None otherwise, or while another request in this
+    process is being profiled.
+    """
+    config = get_config()
+    if not config['ENABLED'] or request.path.startswith(tuple(config['EXCLUDE'])):
+        return None
+    header = request.headers.get(config['HEADER'])
+    if header is not None and config['TOKEN'] and constant_time_compare(header, config['TOKEN']):
+        mode = request.headers.get(config['MODE_HEADER'], config['MODE'])
+    elif config['SAMPLE_RATE'] and random.random() < config['SAMPLE_RATE']:
+        mode = config['MODE']
+    else:
+        return None
+    if mode not in dict(models.RequestProfile.MODE_CHOICES):
+        mode = config['MODE']
+    if not _busy.acquire(blocking=False):
+        return None
+    capture = Capture(mode, config)
+    try:
+        capture.start()
+    except Exception:
+        _busy.release()
+        raise
+    return capture
+
+
+def save(request, response, capture):
+    match = request.resolver_match
+    try:
+        profile = models.RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:500],
+            route=match.route if match is not None else '',
+            status=response.status_code,
+            mode=capture.mode,
+            duration_ms=round(capture.duration * 1000, 3),
+            query_count=capture.query_count,
+            query_ms=round(capture.query_time * 1000, 3),
+            functions=capture.functions(),
+            stacks=capture.stacks(),
+            queries=capture.queries,
+        )
+        prune(capture.config['KEEP'])
+    except DatabaseError:
+        # Losing a profile must not fail the request it describes
+        logger.exception('could not store request profile', extra={'path': request.path})
+        return None
+    return profile
+
+
+def prune(keep):
+    oldest_kept = (
+        models.RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)[keep - 1:keep]
+    )
+    models.RequestProfile.objects.filter(pk__lt=oldest_kept).delete()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles selected requests (see begin) and stores them as
+    RequestProfile rows. The response carries X-Profile-Id so a caller that
+    asked for a profile can fetch it from /api/profiles/<id>/.
+
+    Under ASGI both the event loop thread and the thread the request's
+    sync_to_async work runs in are profiled (async views watch theirs, see
+    watching()).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(self.get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        capture = begin(request)
+        if capture is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            capture.stop()
+        self.finish(response, save(request, response, capture))
+        return response
+
+    async def __acall__(self, request):
+        capture = begin(request)
+        if capture is None:
+            return await self.get_response(request)
+        try:
+            # Thread sensitive, so this is the thread sync views and the ORM run in
+            watched = await sync_to_async(capture.watch)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                if watched:
+                    await sync_to_async(capture.unwatch)()
+        finally:
+            capture.stop()
+        self.finish(response, await sync_to_async(save)(request, response, capture))
+        return response
+
+    def finish(self, response, profile):
+        if profile is not None:
+            response['X-Profile-Id'] = str(profile.pk)
+
+
+def _frame_name(code):
+    return f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _function_name(filename, line, name):
+    if filename == '~':
+        return name  # Built-in, e.g. <method 'execute' of 'sqlite3.Cursor' objects>
+    return f'{name} ({_short_path(filename)}:{line})'
+
+
+def _short_path(filename):
+    # Paths relative to sys.path entries, e.g. rest_framework/views.py
+    global _path_prefixes
+    if _path_prefixes is None:
+        _path_prefixes = sorted({entry.rstrip(os.sep) + os.sep for entry in sys.path if entry}, key=len, reverse=True)
+    for prefix in _path_prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
@@ -0,0 +1,126 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+def plan_queryset(queryset, serializer, keep=(), **fieldset):
+    """
+    Adds the select_related/prefetch_related calls a serializer needs so that
+    serializing the queryset costs a fixed number of queries, however many
+    rows it holds.
+
+    `serializer` is a serializer class (built with the fields/expand in
+    `fieldset`) or instance. When it renders a sparse fieldset (see
+    projects.fieldsets) only the columns it reads are loaded, plus `keep`.
+    """
+    if isinstance(serializer, type):
+        serializer = serializer(**fieldset)
+    select, prefetch = _collect(serializer, queryset.model)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if getattr(serializer, 'sparse', False):
+        columns = _columns(serializer, queryset.model)
+        if columns is not None:
+            queryset = queryset.only(*columns, *keep)
+    return queryset
+
+
+def _collect(serializer, model, prefix=''):
+    select, prefetch = [], []
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        attrs = field.source_attrs
+        relation = _relation(model, attrs[0])
+        if relation is None:
+            continue
+        path = prefix + attrs[0]
+
+        if isinstance(field, serializers.ListSerializer):
+            # Nested many=True serializer, e.g. pledges/updates on an athlete
+            # (keeping the foreign key the prefetch matches rows on)
+            child_qs = plan_queryset(
+                relation.related_model._default_manager.all(), field.child, keep=[relation.field.name],
+            )
+            prefetch.append(Prefetch(path, queryset=child_qs))
+        elif isinstance(field, serializers.BaseSerializer):
+            # Nested single object, follow it and plan its own fields too
+            select.append(path)
+            nested_select, nested_prefetch = _collect(field, relation.related_model, path + '__')
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+        elif isinstance(field, ManyRelatedField):
+            prefetch.append(path)
+        elif isinstance(field, RelatedField) and len(attrs) == 1:
+            # PrimaryKeyRelatedField only reads the <field>_id column
+            continue
+        else:
+            # Dotted sources like 'owner.username' walk forward relations
+            select_path = _select_path(model, attrs)
+            if select_path:
+                select.append(prefix + select_path)
+
+    return select, prefetch
+
+
+def _columns(serializer, model, prefix=''):
+    """
+    The only() names covering every column the serializer reads, or None
+    when it needs whole objects (source='*').
+    """
+    columns = [prefix + model._meta.pk.name]
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return None
+
+        attrs = field.source_attrs
+        try:
+            model_field = model._meta.get_field(attrs[0])
+        except FieldDoesNotExist:
+            continue  # Annotations, prefetched to_attr lists and properties
+        if not model_field.concrete:
+            if model_field.one_to_one:
+                return None  # Reverse one-to-one, loaded whole
+            continue  # Reverse and many-to-many relations are prefetched
+        if model_field.many_to_many:
+            continue
+
+        path = prefix + attrs[0]
+        columns.append(path)
+        if not model_field.is_relation:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            nested = _columns(field, model_field.related_model, path + '__')
+            if nested is not None:
+                columns.extend(nested)
+        elif len(attrs) > 1:
+            select_path = _select_path(model, attrs)
+            if select_path and len(select_path.split('__')) < len(attrs):
+                columns.append(prefix + select_path + '__' + attrs[len(select_path.split('__'))])
+    return columns
+
+
+def _relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _select_path(model, attrs):
+    path = []
+    for attr in attrs:
+        field = _relation(model, attr)
+        if field is None or field.many_to_many or field.one_to_many:
+            break
+        path.append(attr)
+        model = field.related_model
+    return '__'.join(path)
@@ -0,0 +1,163 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from . import models
+from .cache import response_cache
+
+# ?board= keys: (model, athlete id column, value column, indexed ordering).
+# Each ordering matches an index, so the top K rows are read straight off it.
+LEADERBOARDS = {
+    'most_funded': ('AthleteProfile', 'id', 'funds_raised', ('-funds_raised', '-id')),
+    'most_supporters': (
+        'AthleteStats', 'athlete_profile_id', 'supporter_count', ('-supporter_count', '-athlete_profile'),
+    ),
+    'progress': ('AthleteProfile', 'id', 'percent_funded', ('-percent_funded', '-id')),
+}
+
+TRENDING_WINDOWS = {
+    '24h': datetime.timedelta(hours=24),
+    '7d': datetime.timedelta(days=7),
+}
+LONGEST_WINDOW = max(TRENDING_WINDOWS.values())
+# Athletes kept per window in the TrendingRank snapshot
+SNAPSHOT_SIZE = 100
+SNAPSHOT_MAX_AGE = datetime.timedelta(minutes=5)
+
+# When this process last rebuilt the snapshot
+_refreshed_at = None
+
+
+def leaderboard(board, limit=10):
+    """
+    Returns [(athlete_id, value)] for the top `limit` athletes on a board.
+    """
+    model_name, key, value, ordering = LEADERBOARDS[board]
+    model = getattr(models, model_name)
+    return list(model.objects.order_by(*ordering).values_list(key, value)[:limit])
+
+
+def trending(window, limit=10):
+    """
+    Returns the top `limit` TrendingRank rows for a window, rebuilding the
+    snapshot first when it is older than SNAPSHOT_MAX_AGE.
+    """
+    ranks = _read_snapshot(window, limit)
+    now = timezone.now()
+    stale = not ranks or ranks[0].computed_at < now - SNAPSHOT_MAX_AGE
+    # An empty window stays empty; don't rebuild it on every request
+    if stale and (_refreshed_at is None or _refreshed_at < now - SNAPSHOT_MAX_AGE):
+        try:
+            refresh_trending(now)
+        except IntegrityError:
+            pass  # Another worker rebuilt it at the same time
+        ranks = _read_snapshot(window, limit)
+    return ranks
+
+
+def _read_snapshot(window, limit):
+    return list(models.TrendingRank.objects.filter(window=window, rank__lte=limit).order_by('rank'))
+
+
+def refresh_trending(now=None):
+    """
+    Rebuilds the TrendingRank snapshot for every window from the hourly
+    buckets, and drops buckets that have left the longest window.
+    """
+    global _refreshed_at
+    now = now or timezone.now()
+    current = bucket_hour(now)
+
+    ranks = []
+    with transaction.atomic():
+        models.PledgeBucket.objects.filter(hour__lte=current - LONGEST_WINDOW).delete()
+        models.TrendingRank.objects.all().delete()
+        for window, length in TRENDING_WINDOWS.items():
+            rows = (
+                models.PledgeBucket.objects.filter(hour__gt=current - length)
+                .values('athlete_profile_id')
+                .annotate(total=Sum('amount'), pledges=Sum('pledge_count'))
+                .filter(total__gt=0)
+                .order_by('-total', '-pledges', 'athlete_profile_id')[:SNAPSHOT_SIZE]
+            )
+            ranks.extend(
+                models.TrendingRank(
+                    window=window,
+                    rank=rank,
+                    athlete_profile_id=row['athlete_profile_id'],
+                    amount=row['total'],
+                    pledge_count=row['pledges'],
+                    computed_at=now,
+                )
+                for rank, row in enumerate(rows, start=1)
+            )
+        models.TrendingRank.objects.bulk_create(ranks)
+        response_cache.invalidate('trending')
+    _refreshed_at = now
+    return len(ranks)
+
+
+def bucket_hour(moment):
+    return moment.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def rebuild_bucket(athlete_id, hour):
+    """
+    Recomputes one athlete's bucket for the hour starting at `hour` from the
+    Pledge table. Safe to run any number of times, in any order.
+    """
+    if hour <= bucket_hour(timezone.now()) - LONGEST_WINDOW:
+        return  # Too old to trend
+    totals = models.Pledge.objects.filter(
+        athlete_profile_id=athlete_id,
+        date_created__gte=hour,
+        date_created__lt=hour + datetime.timedelta(hours=1),
+    ).aggregate(amount=Sum('amount'), pledge_count=Count('id'))
+    buckets = models.PledgeBucket.objects.filter(athlete_profile_id=athlete_id, hour=hour)
+    if not totals['pledge_count']:
+        buckets.delete()
+    elif models.AthleteProfile.objects.filter(pk=athlete_id).exists():
+        models.PledgeBucket.objects.bulk_create(
+            [models.PledgeBucket(athlete_profile_id=athlete_id, hour=hour, **totals)],
+            update_conflicts=True,
+            unique_fields=['athlete_profile', 'hour'],
+            update_fields=['amount', 'pledge_count'],
+        )
+
+
+def record_new_pledges(pledges):
+    # Bulk inserts: one update per athlete and hour instead of per pledge
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for pledge in pledges:
+        _add_delta(deltas, pledge.snapshot(), 1)
+    _bump_buckets(deltas)
+
+
+def _add_delta(deltas, pledge, sign):
+    hour = bucket_hour(pledge['date_created'])
+    if hour <= bucket_hour(timezone.now()) - LONGEST_WINDOW:
+        return  # Too old to trend
+    delta = deltas[(pledge['athlete_profile_id'], hour)]
+    delta[0] += sign * pledge['amount']
+    delta[1] += sign
+
+
+def _bump_buckets(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    # Make sure each bucket exists, then add to it in SQL so concurrent
+    # pledges can't overwrite each other's increments
+    models.PledgeBucket.objects.bulk_create(
+        [models.PledgeBucket(athlete_profile_id=athlete_id, hour=hour) for athlete_id, hour in deltas],
+        ignore_conflicts=True,
+    )
+    for (athlete_id, hour), (amount, count) in deltas.items():
+        models.PledgeBucket.objects.filter(athlete_profile_id=athlete_id, hour=hour).update(
+            amount=F('amount') + amount,
+            pledge_count=F('pledge_count') + count,
+        )
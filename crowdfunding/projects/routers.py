@@ -0,0 +1,138 @@
+import contextvars
+import hashlib
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'ALIASES': [],  # DATABASES entries that are read replicas of 'default'
+    # Reads stay on the primary this long after a client writes; also how far
+    # behind a replica is assumed to be able to get (see projects/cache.py)
+    'PIN_SECONDS': 5,
+    'CACHE_ALIAS': 'default',  # Where pins are kept; use a shared cache with several workers
+    # Views whose safe-method requests may read from a replica
+    'VIEW_MODULES': ['projects.views', 'projects.async_views', 'users.views'],
+}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Replica alias the current request reads from, set by ReplicaMiddleware.
+# None means the primary.
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REPLICAS', {})}
+
+
+def read_alias():
+    # The replica the current request reads from, None for the primary
+    return _read_alias.get()
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica ReplicaMiddleware picked for the request, and
+    everything else (writes, migrations, reads outside a routed request such
+    as jobs and management commands) to 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {'default', *get_config()['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema from the primary
+        if db in get_config()['ALIASES']:
+            return False
+        return None
+
+
+def client_key(request):
+    """
+    Cache key for whoever sent the request: their token or session. None for
+    anonymous requests, which can't write anything.
+    """
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'replica-pin:' + hashlib.sha256(credential.encode()).hexdigest()
+
+
+def pick_replica(request, view_func, config):
+    """
+    The replica alias this request should read from, or None for the
+    primary: only safe requests to the listed view modules, from clients
+    that haven't written in the last PIN_SECONDS.
+    """
+    if not config['ALIASES'] or request.method not in SAFE_METHODS:
+        return None
+    module = getattr(view_func, '__module__', '')
+    if module not in config['VIEW_MODULES']:
+        return None
+    key = client_key(request)
+    if key is not None and caches[config['CACHE_ALIAS']].get(key):
+        return None
+    # One replica for the whole request, so its reads agree with each other
+    return random.choice(config['ALIASES'])
+
+
+def pin(request, config):
+    key = client_key(request)
+    if key is not None:
+        caches[config['CACHE_ALIAS']].set(key, True, config['PIN_SECONDS'])
+
+
+class ReplicaMiddleware:
+    """
+    Routes the reads of safe requests to a replica, and pins a client to the
+    primary for PIN_SECONDS after any unsafe request so they always see
+    their own writes (e.g. a donor reloading after pledging).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(self.get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        self.finish(request)
+        return response
+
+    async def __acall__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(self.finish)(request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _read_alias.set(pick_replica(request, view_func, get_config()))
+
+    def finish(self, request):
+        config = get_config()
+        if config['ALIASES'] and request.method not in SAFE_METHODS:
+            pin(request, config)
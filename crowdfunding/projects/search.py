@@ -0,0 +1,226 @@
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q
+
+from . import models
+from .cache import response_cache
+
+TABLE = 'projects_athletesearch'
+MAX_TERMS = 16
+# AthleteProfile columns that go into a search document, in build_document order
+DOCUMENT_FIELDS = ['first_name', 'last_name', 'sport', 'bio', 'achievements', 'progress_updates']
+
+
+class SQLiteSearch:
+    """
+    FTS5 virtual table keyed on the athlete id, ranked with bm25. Used for
+    local development and tests.
+    """
+    # bm25 column weights: name, sport, bio, achievements, updates
+    weights = (10.0, 8.0, 2.0, 4.0, 1.0)
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "name, sport, bio, achievements, updates, tokenize = 'porter unicode61')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def upsert(self, cursor, athlete_id, document):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [athlete_id])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, name, sport, bio, achievements, updates) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [athlete_id, *document],
+        )
+
+    def delete(self, cursor, athlete_id):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [athlete_id])
+
+    def search(self, cursor, terms, limit):
+        # Quoted terms can't be read as FTS5 operators; OR ranks partial matches too
+        match = ' OR '.join(f'"{term}"' for term in terms)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+            f'ORDER BY bm25({TABLE}, {weights}) LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearch:
+    """
+    Weighted tsvector per athlete behind a GIN index, ranked with ts_rank.
+    """
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+            'athlete_profile_id bigint PRIMARY KEY '
+            'REFERENCES projects_athleteprofile (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING gin (document)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def upsert(self, cursor, athlete_id, document):
+        name, sport, bio, achievements, updates = document
+        cursor.execute(
+            f'INSERT INTO {TABLE} (athlete_profile_id, document) VALUES (%s, '
+            "setweight(to_tsvector('english', %s), 'A') || "
+            "setweight(to_tsvector('english', %s), 'B') || "
+            "setweight(to_tsvector('english', %s), 'C') || "
+            "setweight(to_tsvector('english', %s), 'D')) "
+            'ON CONFLICT (athlete_profile_id) DO UPDATE SET document = EXCLUDED.document',
+            [athlete_id, f'{name} {sport}', achievements, bio, updates],
+        )
+
+    def delete(self, cursor, athlete_id):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE athlete_profile_id = %s', [athlete_id])
+
+    def search(self, cursor, terms, limit):
+        cursor.execute(
+            f'SELECT athlete_profile_id FROM {TABLE}, to_tsquery(%s, %s) query '
+            'WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s',
+            ['english', ' | '.join(terms), limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackSearch:
+    """
+    No index: plain icontains matching, for databases without full-text
+    support. Unranked beyond newest first.
+    """
+
+    def create(self, cursor):
+        pass
+
+    def drop(self, cursor):
+        pass
+
+    def upsert(self, cursor, athlete_id, document):
+        pass
+
+    def delete(self, cursor, athlete_id):
+        pass
+
+    def search(self, cursor, terms, limit):
+        condition = Q()
+        for term in terms:
+            condition |= (
+                Q(first_name__icontains=term) | Q(last_name__icontains=term)
+                | Q(sport__icontains=term) | Q(bio__icontains=term)
+                | Q(achievements__icontains=term) | Q(updates__title__icontains=term)
+                | Q(updates__content__icontains=term)
+            )
+        athletes = models.AthleteProfile.objects.filter(condition).distinct()
+        return list(athletes.values_list('pk', flat=True)[:limit])
+
+
+def get_backend(vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor == 'sqlite':
+        return SQLiteSearch()
+    if vendor == 'postgresql':
+        return PostgresSearch()
+    return FallbackSearch()
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def search_athletes(query, limit=20):
+    """
+    Returns athlete ids matching `query`, best match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    with connection.cursor() as cursor:
+        return get_backend().search(cursor, terms, limit)
+
+
+def index_athlete(athlete_id):
+    """
+    Rebuilds one athlete's search document from the profile and its
+    progress updates. Called whenever either changes.
+    """
+    document = _document(athlete_id)
+    with connection.cursor() as cursor:
+        if document is None:
+            get_backend().delete(cursor, athlete_id)
+        else:
+            get_backend().upsert(cursor, athlete_id, document)
+
+
+def remove_athlete(athlete_id):
+    with connection.cursor() as cursor:
+        get_backend().delete(cursor, athlete_id)
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Drops and refills the whole index, a batch of athletes at a time.
+    """
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        backend.drop(cursor)
+        backend.create(cursor)
+
+    count = 0
+    athletes = models.AthleteProfile.objects.order_by('pk').values_list('pk', *DOCUMENT_FIELDS)
+    last_pk = 0
+    while True:
+        batch = list(athletes.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        updates = defaultdict(list)
+        rows = models.ProgressUpdate.objects.filter(
+            athlete_profile_id__in=[row[0] for row in batch]
+        ).order_by('pk').values_list('athlete_profile_id', 'title', 'content')
+        for athlete_id, title, content in rows:
+            updates[athlete_id].extend([title, content])
+        with connection.cursor() as cursor:
+            for pk, *athlete in batch:
+                backend.upsert(cursor, pk, build_document(athlete, updates[pk]))
+        count += len(batch)
+    # Cached search pages were ranked against the old index
+    response_cache.invalidate('athletes')
+    return count
+
+
+def _document(athlete_id):
+    athlete = (
+        models.AthleteProfile.objects.filter(pk=athlete_id)
+        .values_list(*DOCUMENT_FIELDS)
+        .first()
+    )
+    if athlete is None:
+        return None
+    updates = models.ProgressUpdate.objects.filter(athlete_profile_id=athlete_id).values_list('title', 'content')
+    return build_document(athlete, [text for update in updates for text in update])
+
+
+def build_document(athlete, update_text):
+    """
+    The indexed columns (name, sport, bio, achievements, updates) for one
+    athlete, from a DOCUMENT_FIELDS row and its progress update text.
+    """
+    first_name, last_name, sport, bio, achievements, progress_updates = athlete
+    return [
+        f'{first_name} {last_name}',
+        sport,
+        bio or '',
+        achievements or '',
+        '\n'.join([progress_updates or '', *update_text]),
+    ]
@@ -0,0 +1,160 @@
+import datetime
+import random
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import aggregates, rankings, search
+from .cache import response_cache
+from .models import AthleteProfile, Pledge, ProgressUpdate, funds_to_goal, percent_funded
+
+SPORTS = [
+    'swimming', 'basketball', 'football', 'tennis', 'athletics', 'gymnastics',
+    'cycling', 'rowing', 'netball', 'hockey', 'cricket', 'surfing',
+]
+FIRST_NAMES = ['Mia', 'Noah', 'Ava', 'Leo', 'Isla', 'Jack', 'Zoe', 'Liam', 'Ruby', 'Oscar', 'Chloe', 'Max']
+LAST_NAMES = ['Reed', 'Harris', 'Nguyen', 'Smith', 'Patel', 'Brown', 'Wilson', 'Taylor', 'Chen', 'Martin']
+WORDS = (
+    'training season state final personal best coach club regional squad selection '
+    'competition medal travel equipment program recovery strength endurance team'
+).split()
+# Share of users per role
+ROLES = [('donor', 0.7), ('athlete', 0.2), ('both', 0.1)]
+
+
+class SeedResult:
+    def __init__(self):
+        self.users = 0
+        self.athletes = 0
+        self.pledges = 0
+        self.updates = 0
+
+    def __str__(self):
+        return (
+            f'{self.users} users, {self.athletes} athletes, '
+            f'{self.pledges} pledges, {self.updates} updates'
+        )
+
+
+def seed(users=1000, athletes=500, pledges=20000, updates=2000, days=30, batch_size=2000, seed=None):
+    """
+    Adds a synthetic data set with bulk inserts, then brings every derived
+    value (funds_raised, stats, trending buckets, search index) up to date
+    the same way the rebuild commands do. Runs can be repeated: each one
+    uses its own username prefix. Pass `seed` for the same data every time.
+    """
+    rng = random.Random(seed)
+    run = uuid.UUID(int=rng.getrandbits(128)).hex[:6]
+    result = SeedResult()
+    now = timezone.now()
+
+    with transaction.atomic():
+        owners, donors = _create_users(rng, run, users, batch_size)
+        result.users = users
+        if not owners or not donors:
+            return result
+
+        athlete_ids = _create_athletes(rng, owners, athletes, batch_size)
+        result.athletes = len(athlete_ids)
+
+        remaining = pledges
+        while remaining > 0:
+            chunk = [
+                Pledge(
+                    athlete_profile_id=rng.choice(athlete_ids),
+                    supporter_id=rng.choice(donors),
+                    amount=Decimal(rng.choice([5, 10, 20, 25, 50, 100, 250])),
+                    anonymous=rng.random() < 0.1,
+                    comment='' if rng.random() < 0.7 else _sentence(rng, 8),
+                    date_created=now - datetime.timedelta(seconds=rng.uniform(0, days * 86400)),
+                )
+                for _ in range(min(batch_size, remaining))
+            ]
+            Pledge.objects.bulk_create(chunk)
+            rankings.record_new_pledges(chunk)
+            remaining -= len(chunk)
+            result.pledges += len(chunk)
+
+        ProgressUpdate.objects.bulk_create(
+            [
+                ProgressUpdate(
+                    athlete_profile_id=rng.choice(athlete_ids),
+                    title=_sentence(rng, 4).capitalize(),
+                    content=_sentence(rng, 40),
+                )
+                for _ in range(updates)
+            ],
+            batch_size=batch_size,
+        )
+        result.updates = updates
+
+        # bulk_create skips Pledge.save, so settle the derived columns in bulk
+        totals = (
+            Pledge.objects.filter(athlete_profile=OuterRef('pk'))
+            .order_by().values('athlete_profile').annotate(total=Sum('amount')).values('total')
+        )
+        seeded = AthleteProfile.objects.filter(pk__in=athlete_ids)
+        seeded.update(funds_raised=Coalesce(Subquery(totals), Value(Decimal('0'))))
+        seeded.update(percent_funded=percent_funded(), funds_to_goal=funds_to_goal())
+        aggregates.rebuild_stats(athlete_ids, batch_size=batch_size)
+
+    search.rebuild_index()
+    rankings.refresh_trending()
+    response_cache.invalidate('athletes', 'pledges', 'updates')
+    return result
+
+
+def _create_users(rng, run, count, batch_size):
+    # One hash for everyone: hashing per user would take longer than the seeding
+    password = make_password('password')
+    roles = [role for role, _ in ROLES]
+    weights = [weight for _, weight in ROLES]
+    CustomUser = get_user_model()
+    users = [
+        CustomUser(
+            username=f'seed-{run}-{number}',
+            password=password,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            email=f'seed-{run}-{number}@example.com',
+            role=rng.choices(roles, weights)[0],
+        )
+        for number in range(count)
+    ]
+    CustomUser.objects.bulk_create(users, batch_size=batch_size)
+    created = CustomUser.objects.filter(username__startswith=f'seed-{run}-').values_list('pk', 'role')
+    owners = [pk for pk, role in created if role in ('athlete', 'both')]
+    donors = [pk for pk, role in created if role in ('donor', 'both')]
+    return owners, donors
+
+
+def _create_athletes(rng, owners, count, batch_size):
+    athletes = [
+        AthleteProfile(
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            age=rng.randint(5, 18),
+            sport=rng.choice(SPORTS),
+            bio=_sentence(rng, 30),
+            achievements=_sentence(rng, 12),
+            goal=Decimal(rng.choice([500, 1000, 2500, 5000, 10000])),
+            is_open=rng.random() < 0.9,
+            owner_id=rng.choice(owners),
+        )
+        for _ in range(count)
+    ]
+    AthleteProfile.objects.bulk_create(athletes, batch_size=batch_size)
+    if athletes and athletes[0].pk is None:
+        # Backends that don't return ids from bulk inserts
+        return list(AthleteProfile.objects.order_by('-pk').values_list('pk', flat=True)[:count])
+    return [athlete.pk for athlete in athletes]
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
@@ -1,11 +1,16 @@
 from rest_framework import serializers
 from .models import AthleteProfile, Pledge, ProgressUpdate
 from django.contrib.auth import get_user_model
+from django.db.models import F, Prefetch, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from .fieldsets import SparseFieldsMixin
+from .metrics import TimedSerializerMixin
+from .querysets import plan_queryset
 
 CustomUser = get_user_model()
 
 # User Serializer
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'password', 'first_name', 'last_name', 'email', 'role']
@@ -29,44 +34,69 @@ class UserSerializer(serializers.ModelSerializer):
         return CustomUser.objects.create_user(**validated_data)
 
 
+# Pledge rules, shared with bulk ingestion (projects/bulk.py)
+PLEDGE_ROLES = ['donor', 'both']
+DONOR_ONLY_MESSAGE = "Please log in as a donor to make a pledge."
+CLOSED_CAMPAIGN_MESSAGE = "Sorry, this campaign is no longer accepting donations."
+
+
+# Nested in place of an athlete id with ?expand=athlete_profile
+class AthleteReferenceSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = AthleteProfile
+        fields = ['id', 'first_name', 'last_name', 'sport', 'image']
+
+
+# Nested in place of a user id with ?expand=owner
+class UserReferenceSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'first_name', 'last_name']
+
+
 # Pledge Serializer
-class PledgeSerializer(serializers.ModelSerializer):
+class PledgeSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     supporter = serializers.ReadOnlyField(source='supporter.id')
     athlete_profile = serializers.PrimaryKeyRelatedField(queryset=AthleteProfile.objects.all())
 
     class Meta:
         model = Pledge
         fields = '__all__'
+        read_only_fields = ['date_created']
+        expandable_fields = {
+            'athlete_profile': (AthleteReferenceSerializer, {}),
+        }
 
     def validate(self, data):
         # Check if the user's role is allowed to create a pledge
-        if self.context['request'].user.role not in ['donor', 'both']:
-            raise serializers.ValidationError(
-                "Please log in as a donor to make a pledge."
-            )
+        if self.context['request'].user.role not in PLEDGE_ROLES:
+            raise serializers.ValidationError(DONOR_ONLY_MESSAGE)
         
         # Check if the campaign is still open
-        if not data['athlete_profile'].is_open:
-            raise serializers.ValidationError(
-                "Sorry, this campaign is no longer accepting donations."
-            )
+        # (partial updates fall back to the pledge's current athlete)
+        athlete_profile = data.get('athlete_profile') or getattr(self.instance, 'athlete_profile', None)
+        if athlete_profile is None or not athlete_profile.is_open:
+            raise serializers.ValidationError(CLOSED_CAMPAIGN_MESSAGE)
         
         return data
 
 
 # Progress Update Serializer
-class ProgressUpdateSerializer(serializers.ModelSerializer):
+class ProgressUpdateSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ProgressUpdate
         fields = ['id', 'athlete_profile', 'title', 'content', 'date_posted']
         read_only_fields = ['date_posted']
+        expandable_fields = {
+            'athlete_profile': (AthleteReferenceSerializer, {}),
+        }
 
     def create(self, validated_data):
         return ProgressUpdate.objects.create(**validated_data)
 
 
 # Athlete Profile Serializer
-class AthleteProfileSerializer(serializers.ModelSerializer):
+class AthleteProfileSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
 
     class Meta:
@@ -76,18 +106,162 @@ class AthleteProfileSerializer(serializers.ModelSerializer):
             'funds_raised', 'is_open', 'funding_breakdown', 'achievements',
             'image', 'video', 'progress_updates', 'owner'
         ]
-
+        read_only_fields = ['funds_raised']  # Maintained by pledge accounting
+        expandable_fields = {
+            'owner': (UserReferenceSerializer, {}),
+        }
 
 
 # Athlete Profile Detail Serializer
-class AthleteProfileDetailSerializer(serializers.ModelSerializer):
-    pledges = PledgeSerializer(many=True, read_only=True)
-    updates = ProgressUpdateSerializer(many=True, read_only=True)
+# Only the newest EMBEDDED_LIMIT pledges and updates are embedded; the rest
+# are paged from /api/athletes/<pk>/pledges/ and /api/athletes/<pk>/updates/
+EMBEDDED_LIMIT = 5
+
+
+class AthleteProfileDetailSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    pledges = PledgeSerializer(many=True, read_only=True, source='latest_pledges')
+    updates = ProgressUpdateSerializer(many=True, read_only=True, source='latest_updates')
+    pledge_count = serializers.IntegerField(read_only=True)
+    update_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = AthleteProfile
         fields = [
             'id', 'first_name', 'last_name', 'bio', 'age', 'sport', 'goal',
             'funds_raised', 'is_open', 'funding_breakdown', 'achievements',
-            'image', 'video', 'progress_updates', 'owner', 'pledges', 'updates'
+            'image', 'video', 'progress_updates', 'owner', 'pledges', 'updates',
+            'pledge_count', 'update_count'
         ]
+        read_only_fields = ['funds_raised']  # Maintained by pledge accounting
+        expandable_fields = {
+            'owner': (UserReferenceSerializer, {}),
+        }
+
+    def to_representation(self, instance):
+        # Athletes that didn't come through embed_latest (e.g. just saved)
+        load_latest(instance, self.fields)
+        return super().to_representation(instance)
+
+
+def latest_pledges(serializer=PledgeSerializer):
+    return plan_queryset(Pledge.objects.order_by('-id'), serializer, keep=['athlete_profile'])
+
+
+def latest_updates(serializer=ProgressUpdateSerializer):
+    return plan_queryset(ProgressUpdate.objects.order_by('-date_posted', '-id'), serializer, keep=['athlete_profile'])
+
+
+def annotate_counts(queryset, fields):
+    """
+    Annotates the pledge_count and update_count that `fields` include,
+    both from AthleteStats so nothing is counted per request.
+    """
+    counts = {}
+    for name in ('pledge_count', 'update_count'):
+        if name in fields:
+            counts[name] = Coalesce(f'stats__{name}', Value(0))
+    return queryset.annotate(**counts)
+
+
+def with_counts(queryset, **fieldset):
+    """
+    An AthleteProfile queryset for AthleteProfileDetailSerializer with the
+    given fields/expand, for a single athlete: the columns and counts it
+    renders. The serializer reads the latest pledges and updates itself
+    (see load_latest).
+    """
+    serializer = AthleteProfileDetailSerializer(**fieldset)
+    return annotate_counts(plan_queryset(queryset, serializer), serializer.fields)
+
+
+def embed_latest(queryset, **fieldset):
+    """
+    with_counts for a page of athletes, plus one query each for the newest
+    pledges and updates of every athlete on the page (a sliced prefetch,
+    numbered with a window function). Lists that aren't rendered aren't
+    fetched.
+    """
+    serializer = AthleteProfileDetailSerializer(**fieldset)
+    fields = serializer.fields
+    prefetches = []
+    if 'pledges' in fields:
+        pledges = latest_pledges(fields['pledges'].child)[:EMBEDDED_LIMIT]
+        prefetches.append(Prefetch('pledges', queryset=pledges, to_attr='latest_pledges'))
+    if 'updates' in fields:
+        updates = latest_updates(fields['updates'].child)[:EMBEDDED_LIMIT]
+        prefetches.append(Prefetch('updates', queryset=updates, to_attr='latest_updates'))
+    queryset = annotate_counts(plan_queryset(queryset, serializer), fields)
+    return queryset.prefetch_related(*prefetches)
+
+
+def load_latest(athlete, fields):
+    """
+    Loads what `fields` render that the athlete wasn't fetched with. Each
+    list is a LIMIT query down the athlete's index, so it costs the same
+    however many pledges the athlete has (the window function in
+    embed_latest numbers them all).
+    """
+    if 'pledges' in fields and not hasattr(athlete, 'latest_pledges'):
+        pledges = latest_pledges(fields['pledges'].child).filter(athlete_profile=athlete.pk)
+        athlete.latest_pledges = list(pledges[:EMBEDDED_LIMIT])
+    if 'updates' in fields and not hasattr(athlete, 'latest_updates'):
+        updates = latest_updates(fields['updates'].child).filter(athlete_profile=athlete.pk)
+        athlete.latest_updates = list(updates[:EMBEDDED_LIMIT])
+    missing = [name for name in ('pledge_count', 'update_count') if name in fields and not hasattr(athlete, name)]
+    if missing:
+        counts = annotate_counts(AthleteProfile.objects.filter(pk=athlete.pk), missing).values(*missing).first()
+        for name in missing:
+            setattr(athlete, name, counts[name] if counts else 0)
+
+
+# Embedded lists: (model, newest-first ordering), both keyed on athlete_profile
+EMBEDDED_LISTS = {
+    'pledges': (Pledge, ('-id',)),
+    'updates': (ProgressUpdate, ('-date_posted', '-id')),
+}
+
+
+def attach_latest_rows(rows, plan):
+    """
+    The compiled-serializer counterpart of embed_latest: sets row['pledges']
+    and row['updates'] on a page of athlete values() rows to the rendered
+    newest EMBEDDED_LIMIT of each, with one windowed query per list.
+    """
+    ids = [row['id'] for row in rows]
+    for name, child in plan.lists.items():
+        model, ordering = EMBEDDED_LISTS[name]
+        grouped = {athlete_id: [] for athlete_id in ids}
+        if ids:
+            ranked = (
+                model.objects.filter(athlete_profile__in=ids)
+                .annotate(embedded_rank=Window(RowNumber(), partition_by=F('athlete_profile'), order_by=ordering))
+                .filter(embedded_rank__lte=EMBEDDED_LIMIT)
+                .order_by('athlete_profile', 'embedded_rank')
+            )
+            for child_row in child.values(ranked, ['athlete_profile']):
+                grouped[child_row['athlete_profile']].append(child_row)
+        for row in rows:
+            row[name] = child.render(grouped[row['id']])
+    return rows
+
+
+# Athlete card summary
+# Built straight from values() rows, so no serializer or model instances
+# are created per athlete and the large text columns are never read.
+ATHLETE_SUMMARY_FIELDS = [
+    'id', 'first_name', 'last_name', 'sport', 'goal', 'funds_raised', 'is_open', 'image'
+]
+
+
+def athlete_summary(row):
+    return {
+        'id': row['id'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'sport': row['sport'],
+        # Match DecimalField output, which renders as a string
+        'goal': str(row['goal']),
+        'funds_raised': str(row['funds_raised']),
+        'is_open': row['is_open'],
+        'image': row['image'],
+    }
@@ -0,0 +1,37 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics, profiling, search
+from .cache import invalidate_athletes
+from .models import AthleteProfile, ProgressUpdate
+
+
+@receiver(post_save, sender=AthleteProfile)
+def athlete_saved(sender, instance, **kwargs):
+    # Edits can move an athlete in or out of any list page
+    invalidate_athletes(instance.pk, tags=['athletes'])
+    search.index_athlete(instance.pk)
+
+
+@receiver(post_delete, sender=AthleteProfile)
+def athlete_deleted(sender, instance, **kwargs):
+    # Pledges and updates go with it
+    invalidate_athletes(instance.pk, tags=['athletes', 'pledges', 'updates'])
+    search.remove_athlete(instance.pk)
+
+
+@receiver(post_save, sender=ProgressUpdate)
+@receiver(post_delete, sender=ProgressUpdate)
+def update_changed(sender, instance, **kwargs):
+    invalidate_athletes(instance.athlete_profile_id, tags=['updates'])
+    search.index_athlete(instance.athlete_profile_id)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    metrics.registry.connection_opened(connection.alias)
+    # Per-request query counts and time, and the SQL log of profiled requests
+    for wrapper in (metrics.record_query, profiling.record_query):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
@@ -0,0 +1,47 @@
+import uuid
+
+from django.utils.dateparse import parse_datetime
+
+from . import aggregates, cache, jobs, rankings
+
+STATS_CHANGED = 'athlete.stats_changed'
+PLEDGES_CHANGED = 'athlete.pledges_changed'
+
+
+def pledge_changed(before, after):
+    """
+    Queues the follow-up work for one pledge write. `before` and `after` are
+    Pledge.snapshot() style dicts, or None on create/delete. Call it in the
+    write's transaction, with the athletes locked (see pledge_deltas).
+    """
+    for athlete_id, delta in aggregates.pledge_deltas(before, after).items():
+        # Each write's delta is its own job, applied once under its key
+        key = f'{STATS_CHANGED}:{uuid.uuid4().hex}'
+        jobs.enqueue(STATS_CHANGED, {'key': key, 'athlete_id': athlete_id, 'delta': delta}, key=key)
+
+    for pledge in (before, after):
+        if pledge is None:
+            continue
+        athlete_id = pledge['athlete_profile_id']
+        hour = rankings.bucket_hour(pledge['date_created']).isoformat()
+        jobs.enqueue(
+            PLEDGES_CHANGED,
+            {'athlete_id': athlete_id, 'hour': hour},
+            # A burst of pledges to one athlete collapses into one queued job
+            key=f'{PLEDGES_CHANGED}:{athlete_id}:{hour}',
+        )
+
+
+@jobs.handler(STATS_CHANGED)
+def stats_changed(key, athlete_id, delta):
+    if not jobs.apply_once(key):
+        return  # Already counted
+    aggregates.apply_delta(athlete_id, **delta)
+    # Supporter counts feed the leaderboards
+    cache.invalidate_athletes(athlete_id, tags=[cache.FUNDING_TAG])
+
+
+@jobs.handler(PLEDGES_CHANGED)
+def pledges_changed(athlete_id, hour):
+    # Recomputed rather than incremented, so repeats and reordering are harmless
+    rankings.rebuild_bucket(athlete_id, parse_datetime(hour))
@@ -1,23 +1,49 @@
 from django.urls import path, include
 from django.views.generic import TemplateView
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # API routes
     path('api/', include([
-        path('athletes/', views.AthleteProfileList.as_view(), name='athlete-profile-list'),
+        path('athletes/', async_views.read_view(views.AthleteProfileList, async_views.AsyncAthleteProfileList), name='athlete-profile-list'),
+        path('athletes/search/', views.AthleteSearch.as_view(), name='athlete-search'),
+        path('athletes/leaderboard/', views.AthleteLeaderboard.as_view(), name='athlete-leaderboard'),
+        path('athletes/trending/', views.AthleteTrending.as_view(), name='athlete-trending'),
         path('athlete/new/', views.AthleteProfileCreate.as_view(), name='athlete-profile-create'),
-        path('athletes/<int:pk>/', views.AthleteProfileDetail.as_view(), name='athlete-profile-detail'),
+        path('athletes/<int:pk>/', async_views.read_view(views.AthleteProfileDetail, async_views.AsyncAthleteProfileDetail), name='athlete-profile-detail'),
+        path('athletes/<int:pk>/pledges/', views.AthletePledgeList.as_view(), name='athlete-pledge-list'),
+        path('athletes/<int:pk>/updates/', views.AthleteProgressUpdateList.as_view(), name='athlete-progress-update-list'),
         path('my-athletes/', views.UserAthletesList.as_view(), name='user-athletes-list'),
         path('my-athletes/<int:pk>/', views.UserAthleteDetail.as_view(), name='user-athlete-detail'),
 
         # Pledge URLs
-        path('pledges/', views.PledgeList.as_view(), name='pledge-list'),
+        path('pledges/', async_views.read_view(views.PledgeList, async_views.AsyncPledgeList), name='pledge-list'),
+        path('pledges/bulk/', views.PledgeBulkCreate.as_view(), name='pledge-bulk-create'),
         path('pledges/<int:pk>/', views.PledgeDetail.as_view(), name='pledge-detail'),
 
         # Progress Update URLs
-        path('updates/', views.ProgressUpdateList.as_view(), name='progress-update-list'),
+        path('updates/', async_views.read_view(views.ProgressUpdateList, async_views.AsyncProgressUpdateList), name='progress-update-list'),
         path('updates/<int:pk>/', views.ProgressUpdateDetail.as_view(), name='progress-update-detail'),
+
+        # Finance exports (admin only)
+        path('exports/pledges/', views.Export.as_view(), {'kind': 'pledges'}, name='export-pledges'),
+        path('exports/athletes/', views.Export.as_view(), {'kind': 'athletes'}, name='export-athletes'),
+
+        # Prometheus scrape target
+        path('metrics/', views.Metrics.as_view(), name='metrics'),
+
+        # Stored request profiles (admin only)
+        path('profiles/', views.ProfileList.as_view(), name='profile-list'),
+        path('profiles/<int:pk>/', views.ProfileDetail.as_view(), name='profile-detail'),
+
+        # Async versions of the read endpoints, always async (the URLs above
+        # use them too when ASYNC_VIEWS is on)
+        path('async/', include([
+            path('athletes/', async_views.AsyncAthleteProfileList.as_view(), name='async-athlete-profile-list'),
+            path('athletes/<int:pk>/', async_views.AsyncAthleteProfileDetail.as_view(), name='async-athlete-profile-detail'),
+            path('pledges/', async_views.AsyncPledgeList.as_view(), name='async-pledge-list'),
+            path('updates/', async_views.AsyncProgressUpdateList.as_view(), name='async-progress-update-list'),
+        ])),
     ])),
 
     # Catch-all route for React frontend
@@ -1,19 +1,50 @@
 from rest_framework.views import APIView
-from django.http import Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.authentication import SessionAuthentication
+from users.authentication import CachedTokenAuthentication
 from django.core.exceptions import ValidationError
-from .models import AthleteProfile, Pledge, ProgressUpdate
+from .models import AthleteProfile, Pledge, ProgressUpdate, RequestProfile
 from .serializers import (
     AthleteProfileSerializer,
     PledgeSerializer,
     ProgressUpdateSerializer,
     AthleteProfileDetailSerializer,
     UserSerializer,
+    ATHLETE_SUMMARY_FIELDS,
+    athlete_summary,
+    annotate_counts,
+    attach_latest_rows,
+    embed_latest,
+    with_counts,
 )
-from .permissions import IsOwnerOrReadOnly, IsSupporterOrReadOnly
-from django.db import transaction
+from .permissions import CanReadMetrics, IsOwnerOrReadOnly, IsSupporterOrReadOnly
+from . import metrics
+from .querysets import plan_queryset
+from .fieldsets import requested, requested_columns
+from .compiled import plan_for
+from .cache import FUNDING_TAG, athlete_tag, cache_response
+from .idempotency import idempotent
+from .filters import (
+    AthleteFilterSerializer,
+    AthleteSearchSerializer,
+    LeaderboardSerializer,
+    TrendingSerializer,
+    filter_athletes,
+)
+from .rankings import LEADERBOARDS, TRENDING_WINDOWS, leaderboard, trending
+from .search import search_athletes
+from .bulk import ingest_pledges, read_rows
+from .exports import FORMATS as EXPORT_FORMATS, aiter_chunks, export_lines, iter_chunks
+from .pagination import (
+    KeysetPaginationMixin,
+    AthleteProfilePagination,
+    PledgePagination,
+    ProgressUpdatePagination,
+)
+from decimal import Decimal
 
 
 # Sign-Up View
@@ -52,37 +83,200 @@ class AthleteProfileCreate(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class AthleteProfileList(APIView):
+def athlete_list_tags(request, data):
+    # A list page goes stale when any athlete on it changes (see
+    # page_tags), or the set changes
+    tags = ['athletes']
+    filters = AthleteFilterSerializer(data=request.query_params)
+    if filters.is_valid() and filters.depends_on_funding:
+        # Any pledge can move an athlete onto a funding-sorted page
+        tags.append(FUNDING_TAG)
+    return tags
+
+
+def page_tags(page):
+    # Tags for the athletes on a page of instances or values() rows; the
+    # rendered data may not have their ids (?fields=)
+    return [athlete_tag(row['id'] if isinstance(row, dict) else row.pk) for row in page]
+
+
+def serialize_page(view, queryset, serializer_class, fieldset):
+    """
+    (page rows, rendered data) for one page of a keyset-paginated view.
+    Read-only list responses go through the serializer's compiled plan
+    (values() rows, see projects.compiled) when it has one, and through DRF
+    over planned model instances otherwise. The output is the same.
+    """
+    plan = plan_for(serializer_class, fieldset)
+    if plan is None:
+        page = view.paginate_queryset(plan_queryset(queryset, serializer_class, **fieldset))
+        return page, serializer_class(page, many=True, **fieldset).data
+    rows = view.paginate_queryset(plan.values(queryset, view.paginator.ordering))
+    return rows, plan.render(rows)
+
+
+def serialize_athlete_page(view, queryset, fieldset):
+    # serialize_page for AthleteProfileDetailSerializer, which embeds each
+    # athlete's newest pledges and updates: one extra query per list for
+    # the whole page, however many athletes are on it
+    plan = plan_for(AthleteProfileDetailSerializer, fieldset)
+    if plan is None:
+        page = view.paginate_queryset(embed_latest(queryset, **fieldset))
+        return page, AthleteProfileDetailSerializer(page, many=True, **fieldset).data
+    rows = view.paginate_queryset(plan.values(annotate_counts(queryset, plan.names), view.paginator.ordering))
+    return rows, plan.render(attach_latest_rows(rows, plan))
+
+
+class AthleteProfileList(KeysetPaginationMixin, APIView):
+    pagination_class = AthleteProfilePagination
+
+    @cache_response(athlete_list_tags)
     def get(self, request):
-        athletes = AthleteProfile.objects.all()
-        serializer = AthleteProfileDetailSerializer(athletes, many=True)
-        return Response(serializer.data)
+        # sport, is_open, age and funding filters plus ?sort= run in the database
+        filters = AthleteFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        athletes, self.paginator.ordering = filter_athletes(
+            AthleteProfile.objects.all(), filters.validated_data
+        )
+
+        if request.query_params.get('view') == 'summary':
+            return self.get_summary(athletes)
+
+        page, data = serialize_athlete_page(self, athletes, requested(request))
+        self.cache_tags = page_tags(page)
+        return self.get_paginated_response(data)
+
+    def get_summary(self, athletes):
+        # Card view: only the columns the cards show, no nested pledges/updates
+        names = requested_columns(self.request, ATHLETE_SUMMARY_FIELDS)
+        ordering_fields = [name.lstrip('-') for name in self.paginator.ordering]
+        rows = athletes.values(*ATHLETE_SUMMARY_FIELDS, *ordering_fields)
+        page = self.paginate_queryset(rows)
+        self.cache_tags = page_tags(page)
+        return self.get_paginated_response(summary_results(page, names))
+
+
+def summary_results(rows, names):
+    # Cards cut down to the ?fields= picked
+    summaries = [athlete_summary(row) for row in rows]
+    if len(names) == len(ATHLETE_SUMMARY_FIELDS):
+        return summaries
+    return [{name: summary[name] for name in names} for summary in summaries]
+
+
+def athlete_search_tags(request, data):
+    # Any profile or update edit can change what matches, pledges change the cards
+    return ['athletes', 'updates'] + [athlete_tag(row['id']) for row in data['results']]
+
+
+class AthleteSearch(APIView):
+
+    @cache_response(athlete_search_tags)
+    def get(self, request):
+        # Ranked in the full-text index, then one query for the matching cards
+        params = AthleteSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        athlete_ids = search_athletes(params.validated_data['q'], params.validated_data['limit'])
+        summaries = athlete_summaries(athlete_ids)
+        results = [summaries[pk] for pk in athlete_ids if pk in summaries]
+        return Response({'results': results})
+
+
+def athlete_summaries(athlete_ids):
+    # Card rows for already ranked ids, in one query
+    rows = AthleteProfile.objects.filter(pk__in=athlete_ids).values(*ATHLETE_SUMMARY_FIELDS)
+    return {row['id']: athlete_summary(row) for row in rows}
+
+
+def ranking_tags(request, data):
+    # Pledges move every board; edits change the cards
+    return ['athletes', FUNDING_TAG, 'trending'] + [athlete_tag(row['id']) for row in data['results']]
 
 
-class UserAthletesList(APIView):
-    authentication_classes = [TokenAuthentication]
+class AthleteLeaderboard(APIView):
+    """
+    Top athletes by funds raised, unique supporters or percent of goal,
+    read in order off an index on the stored totals.
+    """
+
+    @cache_response(ranking_tags)
+    def get(self, request):
+        params = LeaderboardSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        board = params.validated_data['board']
+        ranked = leaderboard(board, params.validated_data['limit'])
+        value_name = LEADERBOARDS[board][2]
+
+        summaries = athlete_summaries([athlete_id for athlete_id, _ in ranked])
+        results = []
+        for rank, (athlete_id, value) in enumerate(ranked, start=1):
+            if athlete_id in summaries:
+                # Decimals render as strings, like the serializers do
+                value = str(value) if isinstance(value, Decimal) else value
+                results.append({'rank': rank, **summaries[athlete_id], value_name: value})
+        return Response({'board': board, 'results': results})
+
+
+class AthleteTrending(APIView):
+    """
+    Athletes pledged the most over the last 24 hours or 7 days, from a
+    snapshot rebuilt every few minutes out of hourly pledge buckets.
+    """
+
+    @cache_response(ranking_tags)
+    def get(self, request):
+        params = TrendingSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        window = params.validated_data['window']
+        ranks = trending(window, params.validated_data['limit'])
+
+        hours = Decimal(TRENDING_WINDOWS[window].total_seconds() / 3600)
+        summaries = athlete_summaries([rank.athlete_profile_id for rank in ranks])
+        results = [
+            {
+                'rank': rank.rank,
+                **summaries[rank.athlete_profile_id],
+                'pledged': str(rank.amount),
+                'pledge_count': rank.pledge_count,
+                'pledged_per_hour': str((rank.amount / hours).quantize(Decimal('0.01'))),
+            }
+            for rank in ranks if rank.athlete_profile_id in summaries
+        ]
+        computed_at = ranks[0].computed_at if ranks else None
+        return Response({'window': window, 'computed_at': computed_at, 'results': results})
+
+
+class UserAthletesList(KeysetPaginationMixin, APIView):
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AthleteProfilePagination
 
     def get(self, request):
         athletes = AthleteProfile.objects.filter(owner=request.user)
-        serializer = AthleteProfileDetailSerializer(athletes, many=True)
-        return Response(serializer.data)
+        _, data = serialize_athlete_page(self, athletes, requested(request))
+        return self.get_paginated_response(data)
 
 
 class AthleteProfileDetail(APIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
-    def get_object(self, pk):
+    def get_object(self, pk, queryset=None):
+        if queryset is None:
+            queryset = AthleteProfile.objects.all()
         try:
-            profile = AthleteProfile.objects.get(pk=pk)
+            profile = queryset.get(pk=pk)
             self.check_object_permissions(self.request, profile)
             return profile
         except AthleteProfile.DoesNotExist:
             raise Http404
 
+    @cache_response(lambda request, data, pk: [athlete_tag(pk)])
     def get(self, request, pk):
-        profile = self.get_object(pk)
-        serializer = AthleteProfileDetailSerializer(profile, context={'request': request})
+        # Counts come with the athlete; the serializer then reads only the
+        # newest few pledges and updates (see load_latest)
+        fieldset = requested(request)
+        profile = self.get_object(pk, with_counts(AthleteProfile.objects.all(), **fieldset))
+        serializer = AthleteProfileDetailSerializer(profile, context={'request': request}, **fieldset)
         return Response(serializer.data)
 
     def put(self, request, pk):
@@ -112,16 +306,53 @@ class AthleteProfileDetail(APIView):
             raise Http404
 
 
+class AthletePledgeList(KeysetPaginationMixin, APIView):
+    # Every pledge to one athlete, newest first
+    pagination_class = PledgePagination
+
+    @cache_response(lambda request, data, pk: [athlete_tag(pk)])
+    def get(self, request, pk):
+        pledges = Pledge.objects.filter(athlete_profile=pk)
+        page, data = serialize_page(self, pledges, PledgeSerializer, requested(request))
+        if not page:
+            get_athlete_or_404(pk)
+        return self.get_paginated_response(data)
+
+
+class AthleteProgressUpdateList(KeysetPaginationMixin, APIView):
+    # Every update posted by one athlete, newest first
+    pagination_class = ProgressUpdatePagination
+
+    @cache_response(lambda request, data, pk: [athlete_tag(pk)])
+    def get(self, request, pk):
+        updates = ProgressUpdate.objects.filter(athlete_profile=pk)
+        page, data = serialize_page(self, updates, ProgressUpdateSerializer, requested(request))
+        if not page:
+            get_athlete_or_404(pk)
+        return self.get_paginated_response(data)
+
+
+def get_athlete_or_404(pk):
+    # Only asked when a page comes back empty, to tell "no pledges" from "no athlete"
+    if not AthleteProfile.objects.filter(pk=pk).exists():
+        raise Http404
+
+
 # Pledge Views
-class PledgeList(APIView):
+class PledgeList(KeysetPaginationMixin, APIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    # Session stays for donors logged in through the site or the browsable
+    # API. It only runs when there is no token, and only reads the session
+    # when the request carries a session cookie.
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    pagination_class = PledgePagination
 
+    @cache_response(lambda request, data: ['pledges'])
     def get(self, request):
-        pledges = Pledge.objects.all()
-        serializer = PledgeSerializer(pledges, many=True)
-        return Response(serializer.data)
+        _, data = serialize_page(self, Pledge.objects.all(), PledgeSerializer, requested(request))
+        return self.get_paginated_response(data)
 
+    @idempotent
     def post(self, request):
         athlete_profile_id = request.data.get('athlete_profile')
         if not athlete_profile_id:
@@ -130,41 +361,144 @@ class PledgeList(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        try:
-            athlete_profile = AthleteProfile.objects.get(id=athlete_profile_id)
-            serializer = PledgeSerializer(data=request.data, context={'request': request})
-            
-            if serializer.is_valid():
-                try:
-                    with transaction.atomic():
-                        pledge = serializer.save(supporter=request.user)
-                        athlete_profile.funds_raised += pledge.amount
-                        athlete_profile.save()
-                    return Response(serializer.data, status=status.HTTP_201_CREATED)
-                except ValidationError as e:
-                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        except AthleteProfile.DoesNotExist:
+        if not AthleteProfile.objects.filter(id=athlete_profile_id).exists():
             return Response(
                 {"error": "Athlete profile not found."}, 
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        serializer = PledgeSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            try:
+                # Pledge.save credits the athlete's funds_raised in the same transaction
+                serializer.save(supporter=request.user)
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            except ValidationError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PledgeBulkCreate(APIView):
+    """
+    Ingests a batch of pledges for offline and partner donations. Accepts a
+    JSON list, or streams a CSV (text/csv) or NDJSON (application/x-ndjson)
+    request body row by row.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    stream_formats = {
+        'text/csv': 'csv',
+        'application/x-ndjson': 'ndjson',
+    }
+
+    def post(self, request):
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type in self.stream_formats:
+            rows = read_rows(request._request, self.stream_formats[content_type])
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response(
+                {"error": "Send a JSON list of pledges, or a CSV or NDJSON body."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = ingest_pledges(rows)
+        if result.failed and not result.created:
+            return Response(result.as_dict(), status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED)
+
+
+class Export(APIView):
+    """
+    Streams every pledge or athlete as CSV (default) or NDJSON, picked with
+    ?output= (DRF keeps ?format= for renderers).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, kind):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"output must be one of {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        lines = export_lines(kind, output)
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_chunks(lines)
+        else:
+            content = iter_chunks(lines)
+        response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[output][0])
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{output}"'
+        return response
+
+
+class Metrics(APIView):
+    """
+    Request metrics for this worker in the Prometheus text format.
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [CanReadMetrics]
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+PROFILE_SUMMARY_FIELDS = [
+    'id', 'created_at', 'method', 'path', 'route', 'status', 'mode', 'duration_ms', 'query_count', 'query_ms',
+]
+
+
+class ProfileList(APIView):
+    """
+    The latest stored request profiles, slowest details left out.
+    Filter with ?route=api/athletes/ (the URL pattern, as in /api/metrics/).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        profiles = RequestProfile.objects.order_by('-created_at', '-id')
+        route = request.query_params.get('route')
+        if route is not None:
+            profiles = profiles.filter(route=route)
+        return Response({'results': list(profiles.values(*PROFILE_SUMMARY_FIELDS)[:50])})
+
+
+class ProfileDetail(APIView):
+    """
+    One request profile with its function stats and SQL log.
+    ?output=collapsed returns the sampled stacks as text for flamegraph tools.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk):
+        try:
+            profile = RequestProfile.objects.get(pk=pk)
+        except RequestProfile.DoesNotExist:
+            raise Http404
+        if request.query_params.get('output') == 'collapsed':
+            return HttpResponse(profile.stacks, content_type='text/plain; charset=utf-8')
+        data = {field: getattr(profile, field) for field in PROFILE_SUMMARY_FIELDS}
+        data.update(functions=profile.functions, queries=profile.queries, has_stacks=bool(profile.stacks))
+        return Response(data)
+
 
 class PledgeDetail(APIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsSupporterOrReadOnly]
 
-    def get_object(self, pk):
+    def get_object(self, pk, queryset=None):
+        if queryset is None:
+            queryset = Pledge.objects.all()
         try:
-            pledge = Pledge.objects.get(pk=pk)
+            pledge = queryset.get(pk=pk)
             self.check_object_permissions(self.request, pledge)
             return pledge
         except Pledge.DoesNotExist:
             raise Http404
 
     def get(self, request, pk):
-        pledge = self.get_object(pk)
-        serializer = PledgeSerializer(pledge, context={'request': request})
+        fieldset = requested(request)
+        pledge = self.get_object(pk, plan_queryset(Pledge.objects.all(), PledgeSerializer, **fieldset))
+        serializer = PledgeSerializer(pledge, context={'request': request}, **fieldset)
         return Response(serializer.data)
 
     def put(self, request, pk):
@@ -187,38 +521,47 @@ class PledgeDetail(APIView):
 
 
 # Progress Update Views
-class ProgressUpdateList(APIView):
+class ProgressUpdateList(KeysetPaginationMixin, APIView):
+    pagination_class = ProgressUpdatePagination
+
+    @cache_response(lambda request, data: ['updates'])
     def get(self, request):
-        updates = ProgressUpdate.objects.all()
-        serializer = ProgressUpdateSerializer(updates, many=True)
-        return Response(serializer.data)
+        _, data = serialize_page(self, ProgressUpdate.objects.all(), ProgressUpdateSerializer, requested(request))
+        return self.get_paginated_response(data)
 
 
 class ProgressUpdateDetail(APIView):
-    def get_object(self, pk):
+    def get_object(self, pk, queryset=None):
+        if queryset is None:
+            queryset = ProgressUpdate.objects.all()
         try:
-            return ProgressUpdate.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except ProgressUpdate.DoesNotExist:
             raise Http404
 
     def get(self, request, pk):
-        update = self.get_object(pk)
-        serializer = ProgressUpdateSerializer(update)
+        fieldset = requested(request)
+        updates = plan_queryset(ProgressUpdate.objects.all(), ProgressUpdateSerializer, **fieldset)
+        update = self.get_object(pk, updates)
+        serializer = ProgressUpdateSerializer(update, **fieldset)
         return Response(serializer.data)
 
 
 class UserAthleteDetail(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_object(self, pk):
+    def get_object(self, pk, queryset=None):
+        if queryset is None:
+            queryset = AthleteProfile.objects.all()
         try:
-            return AthleteProfile.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except AthleteProfile.DoesNotExist:
             raise Http404
 
     def get(self, request, pk):
-        athlete = self.get_object(pk)
-        serializer = AthleteProfileSerializer(athlete)
+        fieldset = requested(request)
+        athlete = self.get_object(pk, plan_queryset(AthleteProfile.objects.all(), AthleteProfileSerializer, **fieldset))
+        serializer = AthleteProfileSerializer(athlete, **fieldset)
         return Response(serializer.data)
 
     def delete(self, request, pk):
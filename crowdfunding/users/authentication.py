@@ -0,0 +1,88 @@
+import copy
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from projects.cache import LRUCache
+
+DEFAULTS = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 60,
+    # Where each token's version is kept; use a shared cache with several workers
+    'ALIAS': 'default',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+# Users and tokens are kept per process, each under its token's version.
+# Signals bump the version in the ALIAS cache, so with a shared cache every
+# worker drops a deleted token or changed user on its next request. With a
+# per-process cache only the worker that made the change does, and the
+# others keep the entry for up to TIMEOUT.
+token_cache = LRUCache(get_config()['MAX_ENTRIES'])
+
+
+def token_cache_key(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _version_key(cache_key):
+    return 'token-auth-version:' + cache_key
+
+
+def token_version(cache_key):
+    # Versions only have to outlive the entries stored under them; one that
+    # expired is replaced, which just drops those entries
+    config = get_config()
+    versions = caches[config['ALIAS']]
+    version = versions.get(_version_key(cache_key))
+    if version is None:
+        # add() so two workers starting the same token agree on one version
+        versions.add(_version_key(cache_key), uuid.uuid4().hex, config['TIMEOUT'])
+        version = versions.get(_version_key(cache_key))
+    return version
+
+
+def remember_token(token, version=None):
+    cache_key = token_cache_key(token.key)
+    if version is None:
+        version = token_version(cache_key)
+    token_cache.set(cache_key, (version, token.user, token), get_config()['TIMEOUT'])
+
+
+def forget_token(key):
+    config = get_config()
+    cache_key = token_cache_key(key)
+    caches[config['ALIAS']].set(_version_key(cache_key), uuid.uuid4().hex, config['TIMEOUT'])
+    token_cache.delete(cache_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps recently seen tokens and their users in
+    a bounded LRU, so authenticated requests skip the Token/user query.
+    Entries are dropped when the token is deleted or the user is saved,
+    in every worker that shares the ALIAS cache.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        # Read before the database, so a change made meanwhile bumps past it
+        version = token_version(cache_key)
+        cached = token_cache.get(cache_key)
+        if cached is None or cached[0] != version:
+            user, token = super().authenticate_credentials(key)
+            remember_token(token, version)
+        else:
+            _, user, token = cached
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # Each request gets its own copy to read and annotate
+        return (copy.copy(user), token)
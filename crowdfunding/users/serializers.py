@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from projects.fieldsets import SparseFieldsMixin
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = get_user_model()  # Dynamically references the custom user model
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'password', 'role')
@@ -1,3 +1,75 @@
+from unittest import mock
+
 from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from projects.cache import LRUCache
+
+from . import authentication
+from .authentication import token_cache
+from .models import CustomUser
+
+
+class CachedTokenAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        caches['default'].clear()
+        self.user = CustomUser.objects.create_user(username='athlete', password='password1', role='athlete')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def auth_queries(self):
+        # Queries against the token table during one authenticated request
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/my-athletes/')
+        return response, [q['sql'] for q in queries if 'authtoken_token' in q['sql']]
+
+    def test_token_lookup_is_cached(self):
+        response, queries = self.auth_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.auth_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    def test_login_populates_cache(self):
+        response = APIClient().post('/api-token-auth/', {'username': 'athlete', 'password': 'password1'})
+        self.assertEqual(response.data['token'], self.token.key)
+        response, queries = self.auth_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    def test_deleted_token_is_rejected(self):
+        self.auth_queries()
+        self.token.delete()
+        response, _ = self.auth_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_changes_are_picked_up(self):
+        self.auth_queries()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.auth_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unknown_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-real-token')
+        response, _ = self.auth_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
-# Create your tests here.
+    def test_other_workers_drop_revoked_tokens(self):
+        self.auth_queries()
+        # Another worker, with its own token cache, deletes the token
+        with mock.patch.object(authentication, 'token_cache', LRUCache()):
+            self.token.delete()
+        response, queries = self.auth_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(queries), 1)
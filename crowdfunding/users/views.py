@@ -6,17 +6,25 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from .models import CustomUser
 from .serializers import CustomUserSerializer
+from .authentication import remember_token
 from django.shortcuts import render
 from django.contrib.auth import get_user_model
 from rest_framework import generics
+from projects.pagination import KeysetPaginationMixin, CustomUserPagination
+from projects.fieldsets import requested
+from projects.querysets import plan_queryset
 
 User = get_user_model()
 
-class CustomUserList(APIView):
+class CustomUserList(KeysetPaginationMixin, APIView):
+    pagination_class = CustomUserPagination
+
     def get(self, request):
-        users = CustomUser.objects.all()
-        serializer = CustomUserSerializer(users, many=True)
-        return Response(serializer.data)
+        fieldset = requested(request)
+        users = plan_queryset(CustomUser.objects.all(), CustomUserSerializer, **fieldset)
+        page = self.paginate_queryset(users)
+        serializer = CustomUserSerializer(page, many=True, **fieldset)
+        return self.get_paginated_response(serializer.data)
 
     def post(self, request):
         serializer = CustomUserSerializer(data=request.data)
@@ -32,15 +40,18 @@ class CustomUserList(APIView):
         )
 
 class CustomUserDetail(APIView):
-    def get_object(self, pk):
+    def get_object(self, pk, queryset=None):
+        if queryset is None:
+            queryset = CustomUser.objects.all()
         try:
-            return CustomUser.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except CustomUser.DoesNotExist:
             raise Http404
 
     def get(self, request, pk):
-        user = self.get_object(pk)
-        serializer = CustomUserSerializer(user)
+        fieldset = requested(request)
+        user = self.get_object(pk, plan_queryset(CustomUser.objects.all(), CustomUserSerializer, **fieldset))
+        serializer = CustomUserSerializer(user, **fieldset)
         return Response(serializer.data)
 
 
@@ -64,6 +75,8 @@ class CustomAuthToken(ObtainAuthToken):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
         token, created = Token.objects.get_or_create(user=user)
+        # The client's next request is authenticated without a query
+        remember_token(token)
 
         return Response({
             'token': token.key,